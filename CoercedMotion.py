@@ -1,92 +1,116 @@
+from itertools import chain
+
 import pandas as pd
 import folium
-import simplekml
-from io import StringIO
-
-df = pd.read_csv('./schedule.csv')
-
-#df = pd.read_csv(StringIO('./schedule.csv'), parse_dates=['departure_date', 'arrival_date'])
-
-# Convert string representation of datetime columns to ISO format while printing
-df['departure_date'] = df['departure_date'].apply(lambda x: pd.to_datetime(x).isoformat())
-df['arrival_date'] = df['arrival_date'].apply(lambda x: pd.to_datetime(x).isoformat())
-
-print(df.head())
-m = folium.Map()
-m.save("footprint.html")
-
-
-# Create a base map
-m = folium.Map(location=[20,0], zoom_start=2)
-
-# Visualize the data
-for _, row in df.iterrows():
-    folium.Marker([row['src_lat'], row['src_lng']], popup=f"From: {row['src_name']}").add_to(m)
-    folium.Marker([row['dst_lat'], row['dst_long']], popup=f"To: {row['dest_name']}").add_to(m)
-    folium.PolyLine([(row['src_lat'], row['src_lng']), (row['dst_lat'], row['dst_long'])], color="blue").add_to(m)
-
-m.save('map.html')
-
-
-
-
-# Create a KML file
-kml = simplekml.Kml()
-
-for _, row in df.iterrows():
-    # Creating the description for the source point
-    src_description = f"""
-    Name: {row['src_name']}
-    Departure Date: {row['departure_date']}
-    Flight Number: {row['flight_num']}
-    Weight: {row['weight']}
-    Passengers: {row['passengers']}
-    Cargo: {row['cargo_description']}
-    """
-    point = kml.newpoint(name=row['src_name'], coords=[(row['src_lng'], row['src_lat'])], description=src_description)
-
-    # Creating the description for the destination point
-    dest_description = f"""
-    Name: {row['dest_name']}
-    Arrival Date: {row['arrival_date']}
-    Flight Number: {row['flight_num']}
-    Weight: {row['weight']}
-    Passengers: {row['passengers']}
-    Cargo: {row['cargo_description']}
-    """
-    point = kml.newpoint(name=row['dest_name'], coords=[(row['dst_long'], row['dst_lat'])], description=dest_description)
-    
-    # Creating the description for the linestring (flight route)
-    line_description = f"""
-    Flight Number: {row['flight_num']}
-    From: {row['src_name']}
-    To: {row['dest_name']}
-    Departure: {row['departure_date']}
-    Arrival: {row['arrival_date']}
-    Weight: {row['weight']}
-    Passengers: {row['passengers']}
-    Cargo: {row['cargo_description']}
-    """
-    linestring = kml.newlinestring(name=f"Flight {row['flight_num']}", coords=[(row['src_lng'], row['src_lat']), (row['dst_long'], row['dst_lat'])], description=line_description)
-
-kml.save("flights.kml")
-
-# Create the Markwhen File
-with open("markwhen.md", "w") as f:
-    f.write("## Flights\n")
-   
-    for _, row in df.iterrows():
-        # f.write(f"---\ntitle: {row['flight_num']} - {row['src_name']} to {row['dest_name']}\nkey:\n  - entry\n---\n\n")
-        f.write(f"{row['departure_date']}Z-{row['arrival_date']}Z: {row['flight_num']} - {row['src_name']} to {row['dest_name']}\n")
-        f.write(f"[{row['src_name']}](location)\n")
-        f.write(f"[{row['dest_name']}](location)\n")
-        # f.write(f"### Flight {row['flight_num']}\n")
-        # f.write(f"* From: {row['src_name']}\n")
-        # f.write(f"* To: {row['dest_name']}\n")
-        # f.write(f"* Departure: {row['departure_date']}\n")
-        # f.write(f"* Arrival: {row['arrival_date']}\n")
-        # f.write(f"* Weight: {row['weight']}\n")
-        # f.write(f"* Passengers: {row['passengers']}\n")
-        # f.write(f"* Cargo: {row['cargo_description']}\n")
-        # f.write("\n")
 
+from airports import (aggregate_endpoints, airport_features, build_airport_index, link_airports,
+                      merge_airport_indexes, route_segments, schedule_endpoints)
+from kml_writer import CHUNK_SIZE, airport_placemarks, iter_flight_kml, iter_kml, route_placemarks, write_kml
+from schedule_loader import SCHEDULE_PATH, load_schedule, read_schedule_chunks
+
+# Typed copy of schedule.csv, rebuilt when the CSV changes
+SCHEDULE_CACHE = './data/schedule.feather'
+
+
+# Format a datetime column like Timestamp.isoformat(), without a per-row apply: always with the
+# time, and with microseconds only on the rows that have them
+def isoformat_column(dates):
+    text = dates.dt.strftime('%Y-%m-%dT%H:%M:%S')
+    micro = dates.dt.microsecond
+    fractional = micro.fillna(0).astype(bool)
+    if fractional.any():
+        text = text.where(~fractional, text + '.' + micro.fillna(0).astype(int).astype(str).str.zfill(6))
+    return text.fillna('NaT')
+
+
+# Convert the datetime columns to ISO format; load_schedule has usually parsed them already
+def parse_dates(df):
+    df = df.copy()
+    for column in ('departure_date', 'arrival_date'):
+        times = df[column]
+        if not pd.api.types.is_datetime64_any_dtype(times):
+            times = pd.to_datetime(times, format='ISO8601')
+        df[column] = isoformat_column(times)
+    return df
+
+
+# Parse dates once and build every column the exporters need in a single columnar pass
+def prepare_schedule(df):
+    df = parse_dates(df)
+
+    flight = df['flight_num'].astype(str)
+    src = df['src_name'].astype(str)
+    dest = df['dest_name'].astype(str)
+    details = ('\n    Weight: ' + df['weight'].astype(str)
+               + '\n    Passengers: ' + df['passengers'].astype(str)
+               + '\n    Cargo: ' + df['cargo_description'].astype(str)
+               + '\n    ')
+
+    df['route_name'] = 'Flight ' + flight
+    df['route_description'] = ('\n    Flight Number: ' + flight
+                               + '\n    From: ' + src
+                               + '\n    To: ' + dest
+                               + '\n    Departure: ' + df['departure_date']
+                               + '\n    Arrival: ' + df['arrival_date']
+                               + details)
+    df['markwhen'] = (df['departure_date'] + 'Z-' + df['arrival_date'] + 'Z: '
+                      + flight + ' - ' + src + ' to ' + dest + '\n'
+                      + '[' + src + '](location)\n'
+                      + '[' + dest + '](location)\n')
+    return df
+
+
+def export_map(df, path='map.html', airports=None):
+    if airports is None:
+        airports = build_airport_index(df)
+
+    # Create a base map
+    m = folium.Map(location=[20, 0], zoom_start=2)
+
+    # Visualize the data: one marker per airport in a single GeoJSON layer and every distinct
+    # route in one multi-polyline, instead of three folium objects per flight
+    folium.GeoJson(
+        {'type': 'FeatureCollection', 'features': airport_features(airports)},
+        popup=folium.GeoJsonPopup(fields=['popup'], labels=False),
+    ).add_to(m)
+    segments = route_segments(link_airports(df, airports), airports)
+    if segments:
+        folium.PolyLine(segments, color="blue").add_to(m)
+
+    m.save(path)
+
+
+def export_kml(df, path='flights.kml', airports=None):
+    # Create a KML file, streamed a chunk of placemarks at a time
+    write_kml(iter_flight_kml(df, airports=airports), path)
+
+
+# Same output as export_kml(), but straight from the CSV in two chunked passes (airports, then
+# routes) so only one chunk is ever in memory; the airport index is sorted, so chunking doesn't
+# change its order
+def export_kml_csv(csv_path=SCHEDULE_PATH, path='flights.kml', chunk_size=CHUNK_SIZE):
+    airports = merge_airport_indexes(
+        aggregate_endpoints(schedule_endpoints(parse_dates(chunk)))
+        for chunk in read_schedule_chunks(csv_path, chunk_size))
+    routes = (route_placemarks(prepare_schedule(chunk)) for chunk in read_schedule_chunks(csv_path, chunk_size))
+    write_kml(iter_kml(chain([airport_placemarks(airports)], routes)), path)
+
+
+def export_markwhen(df, path='markwhen.md'):
+    # Create the Markwhen File
+    with open(path, "w") as f:
+        f.write("## Flights\n")
+        f.writelines(df['markwhen'].tolist())
+
+
+if __name__ == '__main__':
+    df = prepare_schedule(load_schedule(SCHEDULE_PATH, SCHEDULE_CACHE))
+
+    print(df.head())
+    m = folium.Map()
+    m.save("footprint.html")
+
+    airports = build_airport_index(df)
+    export_map(df, 'map.html', airports)
+    export_kml(df, 'flights.kml', airports)
+    export_markwhen(df, 'markwhen.md')
@@ -1,161 +1,324 @@
 import dash
-from dash import dcc, html
-from dash.dependencies import Input, Output
-from dash_table import DataTable
-import pandas as pd
-import plotly.express as px
+from dash import ctx, dcc, html, no_update
+from dash.dependencies import Input, Output, State
+from dash.dash_table import DataTable
 import datetime
+import os
+import time
+import uuid
+from functools import lru_cache
+from flask import Response
 
-from test_data import generate_plane_movements
+from instrumentation import diagnostics_panel, instrument, note_rows
+from live_feed import SnapshotFeed
+from live_map import live_map_figure, viewport_bounds
+from snapshot_diff import TrackingStore, label_snapshot
+from table_patch import PagedTableSessions, describe_update, sort_frame
+from motion import load_airports
+from push_feed import Broadcaster, FeedPublisher
+from spatial_index import GridIndex, viewport
+from test_data import TITLES, PlaneFeed
 
-# Global variables to store the previous state and flight data
-previous_df = pd.DataFrame()
-previous_df = generate_plane_movements(None)
-flight_data = {}  # Dictionary to track flight data
+UPDATE_INTERVAL = 5  # seconds
+TRACKING_PAGE_SIZE = 25
+LIVE_PAGE_SIZE = 50
+
+SIMULATED_SECONDS_PER_TICK = 300  # each tick shows five minutes of flight
+
+# Between ticks the browser moves each aircraft along its heading at its speed, so the map
+# animates smoothly without more server ticks. URSINE_INTERPOLATE=0 turns it off.
+INTERPOLATE = os.environ.get('URSINE_INTERPOLATE', '1') != '0'
+ANIMATION_INTERVAL = 250  # milliseconds, client-side only
+
+# Set URSINE_FLEET_SIZE to load-test with a large synthetic fleet instead of the ten NATO titles
+FLEET_SIZE = int(os.environ.get('URSINE_FLEET_SIZE', 0)) or len(TITLES)
+
+# Set URSINE_PUSH=1 to have new feed versions pushed to the browsers over server-sent events by
+# one background producer, instead of every browser polling on an interval
+PUSH = os.environ.get('URSINE_PUSH', '0') != '0'
+
+# One feed shared by every callback and session; it advances at most once per UPDATE_INTERVAL.
+# Aircraft fly great-circle legs between the airports in schedule.csv.
+feed = SnapshotFeed(PlaneFeed(FLEET_SIZE, airports=load_airports('schedule.csv'), dt=SIMULATED_SECONDS_PER_TICK),
+                    period=UPDATE_INTERVAL, key='title')
+# Entry/exit/update count per flight session, keyed by title. Closed sessions beyond the
+# retention are compacted into per-title summaries.
+tracking = TrackingStore(max_sessions=10_000, max_age=datetime.timedelta(hours=1))
+
+# Last page sent to each browser session, so ticks can be answered with row-level patches
+live_table_sessions = PagedTableSessions(key='title')
+tracking_table_sessions = PagedTableSessions(key='flight_id')
 
 # Initialize the Dash app
 app = dash.Dash(__name__)
+instrument(app)
 
-# App layout
-app.layout = html.Div([
-    # Map and DataFrame container
-    html.Div([
-        # Map container
+# App layout, built per page load so each browser session gets its own id
+def serve_layout():
+    return html.Div([
+        # Map and DataFrame container
         html.Div([
-            dcc.Graph(id='live-map')
-        ], style={'width': '100%', 'display': 'inline-block'}),
+            # Map container
+            html.Div([
+                dcc.Graph(id='live-map')
+            ], style={'width': '100%', 'display': 'inline-block'}),
+
+            # DataFrame container
+            html.Div([
+                DataTable(id='live-data-table',
+                          columns=[{"name": i, "id": i} for i in feed.latest.frame.columns],
+                          style_data_conditional=[
+                              {'if': {'filter_query': '{status} = "addition"',
+                                      'column_id': 'title'},
+                               'backgroundColor': 'green',
+                               'color': 'white'},
+                              {'if': {'filter_query': '{status} = "removal"',
+                                      'column_id': 'title'},
+                               'backgroundColor': 'red',
+                               'color': 'white'}
+                          ],
+                          sort_action='custom',  # Sorted server-side, only the visible page is sent
+                          sort_mode='multi',  # Allow multi-column sort
+                          sort_by=[{'column_id': 'title', 'direction': 'asc'}],  # Default sort by title
+                          page_action='custom',
+                          page_current=0,
+                          page_size=LIVE_PAGE_SIZE)
+            ], style={'width': '100%', 'display': 'inline-block'})
+        ], style={'display': 'flex', 'flex-direction': 'row'}),
 
-        # DataFrame container
+        # New DataTable for tracking entry/exit times and update counts
         html.Div([
-            DataTable(id='live-data-table',
-                      columns=[{"name": i, "id": i} for i in previous_df.columns],
-                      style_data_conditional=[
-                          {'if': {'filter_query': '{status} = "addition"',
-                                  'column_id': 'title'},
-                           'backgroundColor': 'green',
-                           'color': 'white'},
-                          {'if': {'filter_query': '{status} = "removal"',
-                                  'column_id': 'title'},
-                           'backgroundColor': 'red',
-                           'color': 'white'}
-                      ],
-                      sort_action='native',  # Enable sorting
-                      sort_mode='multi',  # Allow multi-column sort
-                      sort_by=[{'column_id': 'title', 'direction': 'asc'}])  # Default sort by title
-        ], style={'width': '100%', 'display': 'inline-block'})
-    ], style={'display': 'flex', 'flex-direction': 'row'}),
-
-    # New DataTable for tracking entry/exit times and update counts
-    html.Div([
-        DataTable(id='tracking-table',
-                  columns=[{"name": "Flight ID", "id": "flight_id"},
-                           {"name": "Title", "id": "title"},
-                           {"name": "Entry Time", "id": "entry"},
-                           {"name": "Exit Time", "id": "exit"},
-                           {"name": "Update Count", "id": "updates"}])
-    ]),
-
-    # Interval component for updating content
-    dcc.Interval(
-        id='interval-component',
-        interval=5*1000,  # in milliseconds
-        n_intervals=0
-    )
-])
+            DataTable(id='tracking-table',
+                      columns=[{"name": "Flight ID", "id": "flight_id"},
+                               {"name": "Title", "id": "title"},
+                               {"name": "Entry Time", "id": "entry"},
+                               {"name": "Exit Time", "id": "exit"},
+                               {"name": "Update Count", "id": "updates"}],
+                      page_action='custom',  # Only the visible page is built and sent
+                      page_current=0,
+                      page_size=TRACKING_PAGE_SIZE)
+        ]),
 
-# Function to read data from CSV
-def read_data_from_csv():
-    global previous_df
-    return generate_plane_movements(previous_df)
+        # Interval component for updating content (only fires once, on load, in push mode)
+        dcc.Interval(
+            id='interval-component',
+            interval=UPDATE_INTERVAL*1000,  # in milliseconds
+            n_intervals=0,
+            disabled=PUSH
+        ),
 
-# Callback for updating the map
-@app.callback(Output('live-map', 'figure'),
-              [Input('interval-component', 'n_intervals')])
-def update_map(n):
-    global previous_df
-    current_df = read_data_from_csv()
-
-    fig = px.scatter_mapbox(
-        current_df, 
-        lat="lat", 
-        lon="lon", 
-        hover_name="title",
-        hover_data=["plane_type", "timestamp"],
-        color_discrete_sequence=["fuchsia"], 
-        height=400)
-
-    fig.update_layout(mapbox_style="open-street-map", 
-                      mapbox_zoom=1, 
-                      mapbox_center={"lat": 20, "lon": 0},  # Example center coordinates
-                      uirevision='constant')
-
-    return fig
-
-# Helper function to update flight_data
-def update_flight_tracking(current_df):
-    global flight_data
-    current_time = datetime.datetime.now()
-
-    existing_titles = set([flight_id.split('_')[0] for flight_id in flight_data])
-    new_titles = set(current_df['title']) - existing_titles
-
-    # Update existing flights
-    for title in existing_titles:
-        if title in current_df['title'].values:
-            flight_id = title + '_' + str(flight_data[title + '_last']['entry'])
-            flight_data[flight_id]['updates'] += 1
-            flight_data[flight_id]['exit'] = None
-
-    # Add new and re-entered flights
-    for title in new_titles:
-        flight_id = title + '_' + str(current_time)
-        flight_data[flight_id] = {'title': title, 'entry': current_time, 'exit': None, 'updates': 1}
-        flight_data[title + '_last'] = {'entry': current_time}
-
-    # Mark exit time for removed flights
-    removed_titles = existing_titles - set(current_df['title'])
-    for title in removed_titles:
-        flight_id = title + '_' + str(flight_data[title + '_last']['entry'])
-        flight_data[flight_id]['exit'] = current_time
-
-# Callback for updating the DataFrame
-@app.callback(Output('live-data-table', 'data'),
-              [Input('interval-component', 'n_intervals')])
-def update_table(n):
-    global previous_df
-    current_df = read_data_from_csv()
-
-    if not previous_df.empty:
-        # Identifying additions and removals
-        current_df['status'] = ''
-        current_df.loc[current_df['title'].isin(previous_df['title']), 'status'] = 'existing'
-        current_df.loc[current_df['title'].isin(
-            current_df[~current_df['title'].isin(previous_df['title'])]['title']), 'status'] = 'addition'
-        previous_df['status'] = 'removal'
-        combined_df = pd.concat([current_df, previous_df[~previous_df['title'].isin(current_df['title'])]])
-    else:
-        combined_df = current_df
-        combined_df['status'] = 'existing'
-
-    # Update flight tracking data
-    update_flight_tracking(current_df)
-
-    # Update the previous DataFrame
-    previous_df = current_df.copy()
-
-    return combined_df.sort_values('title').to_dict('records')
-
-# New callback to update the tracking table
-@app.callback(Output('tracking-table', 'data'),
+        # Last message from the push feed, if enabled
+        dcc.Store(id='push-status'),
+
+        # Feed version published for this tick; every view below renders exactly this version
+        dcc.Store(id='feed-version'),
+
+        # Extent of the map view, so only the aircraft inside it are sent (clustered if many)
+        dcc.Store(id='map-viewport'),
+
+        # Positions and velocities of the current snapshot, extrapolated in the browser
+        dcc.Store(id='live-tracks'),
+        dcc.Interval(id='animation-interval', interval=ANIMATION_INTERVAL, disabled=not INTERPOLATE),
+
+        # Identifies this page load so table updates can be sent as patches against what it has,
+        # and the sequence number of the page each table last applied
+        dcc.Store(id='session-id', data=str(uuid.uuid4())),
+        dcc.Store(id='live-table-sequence'),
+        dcc.Store(id='tracking-table-sequence'),
+        html.Div(id='table-metrics', style={'fontSize': 'small', 'color': 'gray'}),
+        html.Div(id='tracking-table-metrics', style={'fontSize': 'small', 'color': 'gray'}),
+        diagnostics_panel()
+    ])
+
+app.layout = serve_layout
+
+# Single producer: advance the shared feed (if due) and publish the version to the views
+@app.callback(Output('feed-version', 'data'),
               [Input('interval-component', 'n_intervals')])
-def update_tracking_table(n):
-    # Convert the tracking data to a DataFrame
-    tracking_data = []
-    for flight_id, data in flight_data.items():
-        if '_last' not in flight_id:
-            tracking_data.append({'flight_id': flight_id, **data})
-    tracking_df = pd.DataFrame(tracking_data)
-    return tracking_df.to_dict('records')
+def advance_feed(n):
+    return feed.tick().version
+
+# Push mode: the browser subscribes to /feed/events and sets feed-version from each message, so
+# the views below only run when there is a new version. Each open stream holds a server thread.
+if PUSH:
+    broadcaster = Broadcaster()
+    FeedPublisher(feed, broadcaster, UPDATE_INTERVAL).start()
+
+    @app.server.route('/feed/events')
+    def feed_events():
+        return Response(broadcaster.stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    app.clientside_callback(
+        """
+        function(session) {
+            if (window._ursineEvents) {
+                return window.dash_clientside.no_update;
+            }
+            const source = window._ursineEvents = new EventSource('/feed/events');
+            source.addEventListener('snapshot', function(event) {
+                const message = JSON.parse(event.data);
+                if (message.version !== window._ursineVersion) {
+                    window._ursineVersion = message.version;
+                    window.dash_clientside.set_props('feed-version', {data: message.version});
+                }
+                window.dash_clientside.set_props('push-status', {data: message});
+            });
+            return {connecting: true};
+        }
+        """,
+        Output('push-status', 'data'),
+        Input('session-id', 'data')
+    )
+
+# Track the map view as the user pans and zooms; other relayout events keep the last view
+@app.callback(Output('map-viewport', 'data'),
+              [Input('live-map', 'relayoutData')])
+def update_viewport(relayout_data):
+    bounds = viewport_bounds(relayout_data)
+    return no_update if bounds is None else bounds
+
+# Grid index over the positions of a version, shared by every session
+@lru_cache(maxsize=4)
+def snapshot_index(version):
+    frame = feed.snapshot(version).frame
+    return GridIndex(frame['lat'], frame['lon'])
+
+# Map figure and tracks for a version and view, built once and shared by every session with the
+# same view (all of them until they pan or zoom)
+@lru_cache(maxsize=16)
+def map_view(version, bounds):
+    snapshot = feed.snapshot(version)
+    current_df, clusters = viewport(snapshot.frame, snapshot_index(snapshot.version), bounds)
+    fig = live_map_figure(current_df, clusters)
+
+    tracks = {
+        'version': snapshot.version,
+        'created': snapshot.created * 1000,  # server time of the positions, ms since the epoch
+        'lat': current_df['lat'].tolist(),
+        'lon': current_df['lon'].tolist(),
+        'heading': current_df['heading'].tolist(),
+        'speed': current_df['speed'].tolist(),  # km/h
+        'sim_rate': SIMULATED_SECONDS_PER_TICK / UPDATE_INTERVAL,  # simulated seconds per real second
+        'max_seconds': 2 * UPDATE_INTERVAL,  # stop extrapolating if ticks stall
+    }
+    return fig, tracks
+
+# Callback for updating the map: only the aircraft inside this session's view are sent
+@app.callback([Output('live-map', 'figure'),
+               Output('live-tracks', 'data')],
+              [Input('feed-version', 'data'),
+               Input('map-viewport', 'data')])
+def update_map(version, bounds):
+    snapshot = feed.snapshot(version)
+    note_rows(len(snapshot.frame))
+    fig, tracks = map_view(snapshot.version, None if bounds is None else tuple(bounds))
+    # server time at sending, to map the server's clock onto the browser's
+    return fig, dict(tracks, now=time.time() * 1000)
+
+# Dead-reckon every aircraft along its great circle since the snapshot was taken, in the browser.
+# The snapshot's server time is mapped to the browser's clock when a new version arrives (as for
+# flights_dash.py's countdown), so a snapshot fetched late in a tick doesn't start out as fresh.
+app.clientside_callback(
+    """
+    function(n, tracks, figure) {
+        if (!tracks || !figure || !figure.data || !figure.data.length) {
+            return window.dash_clientside.no_update;
+        }
+        const state = window._ursineTracks = window._ursineTracks || {};
+        if (state.version !== tracks.version) {
+            state.version = tracks.version;
+            state.offset = tracks.now - Date.now();
+        }
+        const age = Math.max(0, (Date.now() + state.offset - tracks.created) / 1000);
+        const seconds = Math.min(age, tracks.max_seconds) * tracks.sim_rate;
+        const R = 6371.0, rad = Math.PI / 180;
+        const lat = new Array(tracks.lat.length), lon = new Array(tracks.lat.length);
+        for (let i = 0; i < tracks.lat.length; i++) {
+            const d = tracks.speed[i] * seconds / 3600 / R;
+            const p1 = tracks.lat[i] * rad, l1 = tracks.lon[i] * rad, b = tracks.heading[i] * rad;
+            const p2 = Math.asin(Math.sin(p1) * Math.cos(d) + Math.cos(p1) * Math.sin(d) * Math.cos(b));
+            const l2 = l1 + Math.atan2(Math.sin(b) * Math.sin(d) * Math.cos(p1),
+                                       Math.cos(d) - Math.sin(p1) * Math.sin(p2));
+            lat[i] = p2 / rad;
+            lon[i] = ((l2 / rad + 540) % 360) - 180;
+        }
+        const data = figure.data.slice();
+        data[0] = Object.assign({}, data[0], {lat: lat, lon: lon});
+        return Object.assign({}, figure, {data: data});
+    }
+    """,
+    Output('live-map', 'figure', allow_duplicate=True),
+    Input('animation-interval', 'n_intervals'),
+    State('live-tracks', 'data'),
+    State('live-map', 'figure'),
+    prevent_initial_call=True
+)
+
+# Helper function to update flight tracking from a snapshot diff
+def update_flight_tracking(diff):
+    tracking.update(diff, datetime.datetime.now())
+
+# Tracking follows the feed itself, once per version, not once per session
+feed.subscribe(lambda snapshot: update_flight_tracking(snapshot.diff))
+
+# Labelled snapshot sorted for a given version and sort order, shared by every session
+@lru_cache(maxsize=16)
+def sorted_snapshot(version, sort_key):
+    # Additions, removals and changes were computed once when the feed advanced
+    combined_df = label_snapshot(feed.snapshot(version).diff)
+    sort_by = [{'column_id': column, 'direction': direction} for column, direction in sort_key]
+    return sort_frame(combined_df, sort_by or [{'column_id': 'title', 'direction': 'asc'}])
+
+def page_rows(df, page_current, page_size):
+    start = page_current * page_size
+    return df.iloc[start:start + page_size].to_dict('records')
+
+# Callback for updating the DataFrame: one page, as a patch when only rows changed
+@app.callback([Output('live-data-table', 'data'),
+               Output('live-data-table', 'page_count'),
+               Output('table-metrics', 'children'),
+               Output('live-table-sequence', 'data')],
+              [Input('feed-version', 'data'),
+               Input('live-data-table', 'sort_by'),
+               Input('live-data-table', 'page_current'),
+               Input('live-data-table', 'page_size')],
+              [State('session-id', 'data'),
+               State('live-table-sequence', 'data')])
+def update_table(version, sort_by, page_current, page_size, session_id, applied):
+    page_current = page_current or 0
+    page_size = page_size or LIVE_PAGE_SIZE
+    sort_key = tuple((s['column_id'], s['direction']) for s in sort_by or [])
+
+    combined_df = sorted_snapshot(feed.snapshot(version).version, sort_key)
+    rows = page_rows(combined_df, page_current, page_size)
+    note_rows(len(combined_df))
+    full = ctx.triggered_id != 'feed-version'
+    data, stats = live_table_sessions.update(session_id, rows, full=full, applied=applied)
+
+    page_count = max(1, -(-len(combined_df) // page_size))
+    return (data, page_count, describe_update('Live table', stats, live_table_sessions.mean_bytes()),
+            stats['sequence'])
+
+# New callback to update the tracking table, newest sessions first, one page at a time
+@app.callback([Output('tracking-table', 'data'),
+               Output('tracking-table', 'page_count'),
+               Output('tracking-table-metrics', 'children'),
+               Output('tracking-table-sequence', 'data')],
+              [Input('feed-version', 'data'),
+               Input('tracking-table', 'page_current'),
+               Input('tracking-table', 'page_size')],
+              [State('session-id', 'data'),
+               State('tracking-table-sequence', 'data')])
+def update_tracking_table(version, page_current, page_size, session_id, applied):
+    page_current = page_current or 0
+    page_size = page_size or TRACKING_PAGE_SIZE
+    rows = tracking.page(page_current, page_size).to_dict('records')
+    note_rows(len(rows))
+    full = ctx.triggered_id != 'feed-version'
+    data, stats = tracking_table_sessions.update(session_id, rows, full=full, applied=applied)
+    return (data, tracking.page_count(page_size),
+            describe_update('Tracking table', stats, tracking_table_sessions.mean_bytes()), stats['sequence'])
 
 if __name__ == '__main__':
     app.run_server(debug=True)
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+# Incremental aggregates for dashboard panels: counts per category, means and 1-D/2-D bin counts
+# kept up to date from snapshot diffs instead of rescanning the frame each tick. A diff is
+# applied as: remove the removed rows and the old values of changed rows, add the added rows and
+# the new values of changed rows. Changed rows whose aggregated columns didn't change are
+# skipped, so a tick costs O(changes to those columns).
+
+
+# Base for the aggregates below. Subclasses define `columns` and add(frame, sign=1), which adds
+# (sign=1) or removes (sign=-1) the rows of a frame; start from a full snapshot with add(df).
+class Aggregate:
+    # Apply a snapshot_diff.SnapshotDiff; changed_previous must hold this aggregate's columns
+    def apply(self, diff):
+        self.add(diff.removed, -1)
+        self.add(diff.added, 1)
+        if len(diff.changed):
+            before = diff.changed_previous[self.columns].reset_index(drop=True)
+            after = diff.changed[self.columns].reset_index(drop=True)
+            moved = ((before != after) & ~(before.isna() & after.isna())).any(axis=1).to_numpy()
+            if moved.any():
+                self.add(before[moved], -1)
+                self.add(after[moved], 1)
+        return self
+
+
+# Rows per value of one column
+class Count(Aggregate):
+    def __init__(self, column):
+        self.columns = [column]
+        self.counts = pd.Series(dtype=np.int64)
+
+    def add(self, frame, sign=1):
+        if len(frame):
+            counts = frame[self.columns[0]].value_counts()
+            self.counts = self.counts.add(sign * counts, fill_value=0).astype(np.int64)
+
+    def value(self):
+        return self.counts[self.counts > 0].sort_index()
+
+
+# Mean of the non-missing values of one column
+class Mean(Aggregate):
+    def __init__(self, column):
+        self.columns = [column]
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, frame, sign=1):
+        if len(frame):
+            values = frame[self.columns[0]]
+            self.total += sign * float(values.sum())
+            self.count += sign * int(values.count())
+
+    def value(self):
+        return self.total / self.count if self.count else np.nan
+
+
+# Bin labels of an axis: positions in `edges` for numeric axes (-1 outside), the values themselves
+# for categorical ones (edges=None)
+def bin_labels(values, edges):
+    if edges is None:
+        return values.to_numpy()
+    labels = np.searchsorted(edges, values.to_numpy(dtype=float), side='right') - 1
+    labels[values.to_numpy(dtype=float) == edges[-1]] = len(edges) - 2  # last bin is closed
+    labels[(labels < 0) | (labels >= len(edges) - 1)] = -1
+    return labels
+
+
+# Counts over fixed bins of one numeric column (left-closed, the last bin closed on both sides)
+class Bins(Aggregate):
+    def __init__(self, column, edges):
+        self.columns = [column]
+        self.edges = np.asarray(edges, dtype=float)
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+
+    def add(self, frame, sign=1):
+        if len(frame):
+            labels = bin_labels(frame[self.columns[0]], self.edges)
+            self.counts += sign * np.bincount(labels[labels >= 0], minlength=len(self.counts))
+
+    def centers(self):
+        return (self.edges[:-1] + self.edges[1:]) / 2
+
+    def value(self):
+        return pd.Series(self.counts, index=self.centers())
+
+
+# Counts over the cells of two columns; each axis has fixed edges or is categorical (edges=None).
+# value() is a y-by-x frame of counts, ready for a heatmap.
+class Bins2D(Aggregate):
+    def __init__(self, x, y, x_edges=None, y_edges=None):
+        self.columns = [x, y]
+        self.x_edges = None if x_edges is None else np.asarray(x_edges, dtype=float)
+        self.y_edges = None if y_edges is None else np.asarray(y_edges, dtype=float)
+        self.counts = pd.Series(dtype=np.int64, index=pd.MultiIndex.from_arrays([[], []], names=['x', 'y']))
+
+    def add(self, frame, sign=1):
+        if not len(frame):
+            return
+        x = bin_labels(frame[self.columns[0]], self.x_edges)
+        y = bin_labels(frame[self.columns[1]], self.y_edges)
+        inside = np.ones(len(frame), dtype=bool)
+        if self.x_edges is not None:
+            inside &= x >= 0
+        if self.y_edges is not None:
+            inside &= y >= 0
+        counts = pd.DataFrame({'x': x[inside], 'y': y[inside]}).value_counts()
+        self.counts = self.counts.add(sign * counts, fill_value=0).astype(np.int64)
+
+    def value(self):
+        grid = self.counts[self.counts > 0].unstack('x', fill_value=0)
+        if self.y_edges is not None:
+            grid = grid.reindex(range(len(self.y_edges) - 1), fill_value=0)
+        if self.x_edges is not None:
+            grid = grid.reindex(columns=range(len(self.x_edges) - 1), fill_value=0)
+        return grid.sort_index().sort_index(axis=1)
@@ -0,0 +1,116 @@
+import pandas as pd
+
+from schedule_loader import decimal_floats
+
+# Airport index: one row per unique (name, lat, lng) across the source and destination
+# columns of a schedule, with departure/arrival counts and a short list of flights for popups.
+# Legs reference airports by position through src_airport / dst_airport.
+
+AIRPORT_KEYS = ['name', 'lat', 'lng']
+MAX_LISTED_FLIGHTS = 10
+
+
+# Stack source and destination columns into one endpoint per row and role
+def schedule_endpoints(df):
+    flight = df['flight_num'].astype(str)
+    src = pd.DataFrame({'name': df['src_name'], 'lat': df['src_lat'], 'lng': df['src_lng'],
+                        'departures': 1, 'arrivals': 0,
+                        'departing': flight + ' (' + df['departure_date'].astype(str) + ')',
+                        'arriving': None})
+    dst = pd.DataFrame({'name': df['dest_name'], 'lat': df['dst_lat'], 'lng': df['dst_long'],
+                        'departures': 0, 'arrivals': 1,
+                        'departing': None,
+                        'arriving': flight + ' (' + df['arrival_date'].astype(str) + ')'})
+    return pd.concat([src, dst], ignore_index=True)
+
+
+def first_flights(labels):
+    return labels.dropna().head(MAX_LISTED_FLIGHTS).tolist()
+
+
+def merge_flight_lists(lists):
+    merged = []
+    for flights in lists:
+        merged.extend(flights)
+        if len(merged) >= MAX_LISTED_FLIGHTS:
+            break
+    return merged[:MAX_LISTED_FLIGHTS]
+
+
+def aggregate_endpoints(endpoints):
+    grouped = endpoints.groupby(AIRPORT_KEYS, sort=False)
+    airports = grouped[['departures', 'arrivals']].sum()
+    airports['departing'] = grouped['departing'].agg(first_flights)
+    airports['arriving'] = grouped['arriving'].agg(first_flights)
+    return airports
+
+
+# Combine per-chunk indexes, e.g. when a schedule is read with pd.read_csv(..., chunksize=...)
+def merge_airport_indexes(indexes):
+    stacked = pd.concat(indexes)
+    grouped = stacked.groupby(level=AIRPORT_KEYS, sort=False)
+    airports = grouped[['departures', 'arrivals']].sum()
+    airports['departing'] = grouped['departing'].agg(merge_flight_lists)
+    airports['arriving'] = grouped['arriving'].agg(merge_flight_lists)
+    return with_summary(airports)
+
+
+def flight_list(counts, flights):
+    listed = flights.map(', '.join)
+    more = counts - flights.map(len)
+    return listed + more.map(lambda n: f', … +{n} more' if n > 0 else '')
+
+
+# Airports in (name, lat, lng) order, so an index built in one pass and one merged from chunks
+# list them, and number them, the same way
+def with_summary(airports):
+    airports = airports.sort_index(key=lambda level: level.astype(str) if level.name == 'name' else level)
+    names = airports.index.get_level_values('name').astype(str)
+    airports['summary'] = (names
+                           + '\nDepartures: ' + airports['departures'].astype(str)
+                           + '\n' + flight_list(airports['departures'], airports['departing'])
+                           + '\nArrivals: ' + airports['arrivals'].astype(str)
+                           + '\n' + flight_list(airports['arrivals'], airports['arriving']))
+    return airports
+
+
+# Build the index for a whole schedule frame
+def build_airport_index(df):
+    return with_summary(aggregate_endpoints(schedule_endpoints(df)))
+
+
+def airport_positions(airports, names, lats, lngs):
+    return airports.index.get_indexer(pd.MultiIndex.from_arrays([names, lats, lngs]))
+
+
+# Attach src_airport / dst_airport positions into the index to each leg
+def link_airports(df, airports):
+    df = df.copy()
+    df['src_airport'] = airport_positions(airports, df['src_name'], df['src_lat'], df['src_lng'])
+    df['dst_airport'] = airport_positions(airports, df['dest_name'], df['dst_lat'], df['dst_long'])
+    return df
+
+
+# (src_airport, dst_airport) pairs as [[lat, lng], [lat, lng]] segments, one per distinct route
+# by default or one per leg with unique=False
+def route_segments(df, airports, unique=True):
+    pairs = df[['src_airport', 'dst_airport']]
+    if unique:
+        pairs = pairs.drop_duplicates()
+    lat = decimal_floats(airports.index.get_level_values('lat'))
+    lng = decimal_floats(airports.index.get_level_values('lng'))
+    src, dst = pairs['src_airport'].to_numpy(), pairs['dst_airport'].to_numpy()
+    return [[[a_lat, a_lng], [b_lat, b_lng]]
+            for a_lat, a_lng, b_lat, b_lng in zip(lat[src].tolist(), lng[src].tolist(),
+                                                  lat[dst].tolist(), lng[dst].tolist())]
+
+
+# One GeoJSON point per airport, with the aggregated summary as its popup text
+def airport_features(airports):
+    return [
+        {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [lng, lat]},
+         'properties': {'popup': summary}}
+        for lat, lng, summary in zip(decimal_floats(airports.index.get_level_values('lat')).tolist(),
+                                     decimal_floats(airports.index.get_level_values('lng')).tolist(),
+                                     airports['summary'].tolist())
+    ]
@@ -0,0 +1,434 @@
+import argparse
+import base64
+import importlib
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import datetime
+
+import numpy as np
+import pandas as pd
+
+import CoercedMotion
+from interval_index import airport_overlaps
+from live_feed import SnapshotFeed
+from live_map import live_map_figure
+from schedule_loader import load_schedule, schedule_intervals, typed_schedule
+from spatial_index import WORLD, GridIndex, viewport
+from snapshot_diff import TrackingStore, diff_snapshots, status_frame
+from table_patch import PagedTableSessions, payload_bytes
+from test_data import PlaneFeed, generate_schedule
+from watched_csv import WatchedCSV
+
+# folium builds one Python object per marker, so the map stage is skipped above this size
+MAP_ROW_LIMIT = 100_000
+
+RESULTS_DIR = 'bench_results'
+
+# Every report() of this run, written out as JSON at the end
+results = []
+last_peak = None  # bytes allocated at the peak of the last timed() call, when run with --memory
+
+
+def timed(fn, *args, **kwargs):
+    global last_peak
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    last_peak = tracemalloc.get_traced_memory()[1] - before if tracing else None
+    return result, seconds
+
+
+# Print one measurement and keep it for the JSON file; `extra` holds benchmark-specific figures
+def report(name, rows, seconds, **extra):
+    global last_peak
+    rate = rows / seconds if seconds else float('inf')
+    line = f"{name:<28} {rows:>10,} rows {seconds:>9.3f} s {rate:>14,.0f} rows/s"
+    result = {'benchmark': name, 'rows': rows, 'seconds': seconds}
+    if last_peak is not None:
+        result['peak_mib'] = last_peak / 2**20
+        line += f" {result['peak_mib']:>9,.1f} MiB peak"
+        last_peak = None
+    print(line)
+    result.update(extra)
+    results.append(result)
+
+
+def skipped(name, rows, reason):
+    print(f"{name:<28} {rows:>10,} rows  skipped ({reason})")
+    results.append({'benchmark': name, 'rows': rows, 'skipped': reason})
+
+
+# Synthetic schedule.csv of `size` legs in `directory`
+def write_schedule(directory, size, seed):
+    path = os.path.join(directory, 'schedule.csv')
+    generate_schedule(size, seed=seed).to_csv(path, index=False)
+    return path
+
+
+# CoercedMotion.py: one prepare pass feeding map.html, flights.kml and markwhen.md
+def bench_export(sizes):
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as out:
+            raw, seconds = timed(load_schedule, write_schedule(out, size, seed=size))
+            report('export/read_csv', size, seconds)
+
+            df, seconds = timed(CoercedMotion.prepare_schedule, raw)
+            report('export/prepare', size, seconds)
+
+            if size <= MAP_ROW_LIMIT:
+                _, seconds = timed(CoercedMotion.export_map, df, os.path.join(out, 'map.html'))
+                report('export/map', size, seconds)
+            else:
+                skipped('export/map', size, f"> {MAP_ROW_LIMIT:,}")
+
+            _, seconds = timed(CoercedMotion.export_kml, df, os.path.join(out, 'flights.kml'))
+            report('export/kml', size, seconds)
+
+            _, seconds = timed(CoercedMotion.export_markwhen, df, os.path.join(out, 'markwhen.md'))
+            report('export/markwhen', size, seconds)
+
+
+# flights.kml streamed straight from a CSV: peak traced memory should stay flat as size grows
+def bench_kml_stream(sizes):
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as out:
+            csv_path = write_schedule(out, size, seed=size)
+
+            _, seconds = timed(CoercedMotion.export_kml_csv, csv_path, os.path.join(out, 'flights.kml'))
+            if tracemalloc.is_tracing():
+                report('kml/stream_csv', size, seconds)
+                continue
+
+            # separate traced run, tracemalloc slows the timed one down too much
+            tracemalloc.start()
+            CoercedMotion.export_kml_csv(csv_path, os.path.join(out, 'flights.kml'))
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            report('kml/stream_csv', size, seconds, peak_mib=peak / 2**20)
+            print(f"{'':<28} peak traced memory {peak / 2**20:,.1f} MiB")
+
+
+# Synthetic snapshot of `size` tracks and a successor with 5% moved, 2.5% removed, 2.5% added
+def snapshot_pair(size, seed=0):
+    rng = np.random.default_rng(seed)
+    previous = pd.DataFrame({
+        'title': 'T' + pd.Series(np.arange(size)).astype(str),
+        'lat': rng.uniform(-90, 90, size),
+        'lon': rng.uniform(-180, 180, size),
+        'plane_type': rng.choice(['A320', 'B737', 'A380'], size),
+    })
+    churn = max(1, size // 40)
+    current = previous.drop(rng.choice(size, churn, replace=False))
+    moved = rng.choice(len(current), max(1, size // 20), replace=False)
+    current.iloc[moved, current.columns.get_loc('lat')] += 0.1
+    added = previous.iloc[:churn].assign(title='N' + pd.Series(np.arange(churn)).astype(str).to_numpy())
+    return previous, pd.concat([current, added], ignore_index=True)
+
+
+# URSINEEVOKER.py: keyed snapshot diff and the tracking store that consumes it
+def bench_diff(sizes):
+    for size in sizes:
+        previous, current = snapshot_pair(size, seed=size)
+        diff, seconds = timed(diff_snapshots, previous, current, key='title')
+        report('diff/diff_snapshots', size, seconds)
+
+        store = TrackingStore()
+        store.update(diff_snapshots(pd.DataFrame(), previous), datetime.datetime.now())
+        _, seconds = timed(store.update, diff, datetime.datetime.now())
+        report('diff/tracking_update', size, seconds)
+
+
+# test_data.PlaneFeed: one vectorised step, full snapshot vs. changed rows only
+def bench_feed(sizes):
+    for size in sizes:
+        feed = PlaneFeed(size, move_fraction=0.05, seed=size)
+        _, seconds = timed(feed.step)
+        report('feed/step', size, seconds)
+        _, seconds = timed(feed.step, changes_only=True)
+        report('feed/step_changes_only', size, seconds)
+
+
+# test_data.PlaneFeed flying great-circle legs between 500 synthetic airports
+def bench_motion(sizes):
+    rng = np.random.default_rng(0)
+    airports = (rng.uniform(-60, 70, 500), rng.uniform(-180, 180, 500))
+    for size in sizes:
+        feed = PlaneFeed(size, airports=airports, seed=size)
+        _, seconds = timed(feed.step)
+        report('motion/step', size, seconds)
+
+
+# flights_dash.py: keyed change status of a re-read schedule with 1% of legs each added,
+# removed and modified, and the first table page sent to the browser
+def bench_highlight(sizes):
+    for size in sizes:
+        previous = generate_schedule(size, seed=size)
+        churn = max(1, size // 100)
+        current = previous.iloc[churn:].copy()
+        current.iloc[:churn, current.columns.get_loc('passengers')] += 1
+        added = generate_schedule(churn, seed=size + 1)
+        added['flight_num'] = 'NEW' + added['flight_num']
+        current = pd.concat([current, added], ignore_index=True)
+
+        table, seconds = timed(status_frame, previous, current, key='flight_num')
+        report('highlight/status_frame', size, seconds)
+        page, seconds = timed(lambda: table.iloc[:50].to_dict('records'))
+        report('highlight/first_page', 50, seconds)
+
+
+# Interval index over departure/arrival: mean latency of 100 point-in-time and 100 one-day range
+# queries against a full scan, plus the per-airport overlap flags
+def bench_intervals(sizes):
+    rng = np.random.default_rng(0)
+    for size in sizes:
+        df = typed_schedule(generate_schedule(size, seed=size))
+        intervals, seconds = timed(schedule_intervals, df)
+        report('intervals/build', size, seconds)
+
+        starts, ends = df['departure_date'].to_numpy(), df['arrival_date'].to_numpy()
+        times = pd.Timestamp('2023-08-20') + pd.to_timedelta(rng.integers(0, 30 * 24 * 60, 100), unit='min')
+        for name, width in (('at', pd.Timedelta(0)), ('day', pd.Timedelta(days=1))):
+            start = time.perf_counter()
+            found = sum(len(intervals.overlapping(t, t + width)) for t in times)
+            indexed = (time.perf_counter() - start) / len(times)
+            start = time.perf_counter()
+            for t in times[:10]:
+                np.flatnonzero((starts <= (t + width).to_datetime64()) & (ends >= t.to_datetime64()))
+            scan = (time.perf_counter() - start) / 10
+            print(f"{'intervals/' + name:<28} {size:>10,} rows {indexed * 1e3:>9.3f} ms per query "
+                  f"({found // len(times):,} legs), full scan {scan * 1e3:,.3f} ms")
+            results.append({'benchmark': 'intervals/' + name, 'rows': size, 'seconds': indexed,
+                            'legs': found // len(times), 'scan_seconds': scan})
+
+        _, seconds = timed(airport_overlaps, df)
+        report('intervals/airport_overlaps', size, seconds)
+
+
+def report_figure(name, rows, seconds, fig):
+    points, clusters, size = len(fig.data[0].lat), len(fig.data[1].lat), len(fig.to_json())
+    report(name, rows, seconds, points=points, clusters=clusters, figure_bytes=size)
+    print(f"{'':<28} {points:,} points, {clusters:,} clusters, {size / 2**10:,.0f} KiB figure JSON")
+
+
+# URSINEEVOKER.py's live map: the whole fleet vs. grid-index culling and clustering
+def bench_spatial(sizes):
+    rng = np.random.default_rng(0)
+    airports = (rng.uniform(-60, 70, 500), rng.uniform(-180, 180, 500))
+    europe = (35.0, 60.0, -10.0, 30.0)
+    for size in sizes:
+        frame = PlaneFeed(size, airports=airports, seed=size).snapshot()
+        index, seconds = timed(GridIndex, frame['lat'], frame['lon'])
+        report('spatial/index', size, seconds)
+
+        if size <= MAP_ROW_LIMIT:
+            fig, seconds = timed(live_map_figure, frame, frame.iloc[:0].assign(count=0))
+            report_figure('spatial/figure_all', size, seconds, fig)
+        else:
+            skipped('spatial/figure_all', size, f"> {MAP_ROW_LIMIT:,}")
+
+        for name, bounds in (('world', WORLD), ('europe', europe)):
+            start = time.perf_counter()
+            fig = live_map_figure(*viewport(frame, index, bounds))
+            report_figure(f'spatial/figure_{name}', size, time.perf_counter() - start, fig)
+
+
+# The Dash apps are imported only by the benchmarks that call them, so the others still run
+# where an app's dependencies are missing
+def entry_point(module):
+    try:
+        return importlib.import_module(module)
+    except ImportError as e:
+        print(f"{module:<28} skipped ({e})")
+        results.append({'benchmark': module, 'skipped': str(e)})
+        return None
+
+
+# Call a Dash callback outside a request, as if `prop_id` had triggered it. Goes through dash's
+# private callback context, which is what ctx.triggered_id reads.
+def triggered(fn, prop_id, *args):
+    from dash._callback_context import context_value
+    from dash._utils import AttributeDict
+    context_value.set(AttributeDict(triggered_inputs=[{'prop_id': prop_id, 'value': None}]))
+    return timed(fn, *args)
+
+
+# dasher.py: upload parse and index, flight options for the whole span, the Gantt chart for all
+# of them and the KML download
+def bench_dasher(sizes):
+    dasher = entry_point('dasher')
+    if dasher is None:
+        return
+    for size in sizes:
+        csv = generate_schedule(size, seed=size).to_csv(index=False).encode()
+        contents = 'data:text/csv;base64,' + base64.b64encode(csv).decode()
+
+        (key, _, window), seconds = timed(dasher.populate_checklist, contents)
+        report('dasher/populate_checklist', size, seconds)
+        (options, _), seconds = timed(dasher.update_flight_options, key, window)
+        report('dasher/update_flight_options', size, seconds)
+
+        selected = [option['value'] for option in options]
+        (_, fig, _, _), seconds = triggered(dasher.update_visualization, 'flight-selector.value',
+                                            selected, window, None, key)
+        report('dasher/update_visualization', size, seconds, bars=sum(len(trace.x) for trace in fig.data))
+
+        kml, seconds = timed(dasher.generate_kml, dasher.upload_cache.get(key))
+        report('dasher/generate_kml', size, seconds, kml_bytes=len(kml))
+
+
+# URSINEEVOKER.py: one feed tick of `size` aircraft and the callbacks it fans out to. The app's
+# feed and stores are swapped for fresh ones per size, on a clock advanced by hand.
+def bench_ursine(sizes):
+    ursine = entry_point('URSINEEVOKER')
+    if ursine is None:
+        return
+    rng = np.random.default_rng(0)
+    airports = (rng.uniform(-60, 70, 500), rng.uniform(-180, 180, 500))
+    for size in sizes:
+        clock = [0.0]
+        ursine.feed = SnapshotFeed(PlaneFeed(size, airports=airports, seed=size), period=1, key='title',
+                                   clock=lambda: clock[0])
+        ursine.tracking = TrackingStore(max_sessions=10_000, max_age=datetime.timedelta(hours=1))
+        ursine.live_table_sessions = PagedTableSessions(key='title')
+        ursine.tracking_table_sessions = PagedTableSessions(key='flight_id')
+        ursine.sorted_snapshot.cache_clear()
+        ursine.snapshot_index.cache_clear()
+        ursine.map_view.cache_clear()
+        ursine.update_flight_tracking(ursine.feed.snapshot().diff)
+
+        # the first tick sends whole pages, the second only patches
+        live_applied = tracking_applied = None
+        for tick in (1, 2):
+            clock[0] = tick
+            snapshot, seconds = timed(ursine.feed.tick)
+            report('ursine/feed_tick', size, seconds)
+            _, seconds = timed(ursine.update_flight_tracking, snapshot.diff)
+            report('ursine/update_flight_tracking', size, seconds)
+            _, seconds = triggered(ursine.update_map, 'feed-version.data', snapshot.version, None)
+            report('ursine/update_map', size, seconds)
+            # another session with the same view gets the figure built for the first one
+            _, seconds = triggered(ursine.update_map, 'feed-version.data', snapshot.version, None)
+            report('ursine/update_map_shared', size, seconds)
+            (data, _, _, live_applied), seconds = triggered(ursine.update_table, 'feed-version.data',
+                                                            snapshot.version, [], 0, None, 'bench', live_applied)
+            report('ursine/update_table', size, seconds, payload_bytes=payload_bytes(data))
+            (data, _, _, tracking_applied), seconds = triggered(ursine.update_tracking_table, 'feed-version.data',
+                                                                snapshot.version, 0, None, 'bench', tracking_applied)
+            report('ursine/update_tracking_table', size, seconds, payload_bytes=payload_bytes(data))
+
+
+# flights_dash.py: schedule.csv read through the watcher, re-read after 1% more legs are
+# appended, and the change highlighting of the result
+def bench_flights_dash(sizes):
+    flights_dash = entry_point('flights_dash')
+    if flights_dash is None:
+        return
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as out:
+            path = write_schedule(out, size, seed=size)
+            schedule = WatchedCSV(path, read=flights_dash.read_schedule)
+            (previous, _), seconds = timed(schedule.read)
+            report('flights_dash/read', size, seconds)
+
+            added = generate_schedule(max(1, size // 100), seed=size + 1)
+            added['flight_num'] = 'NEW' + added['flight_num']
+            added.to_csv(path, mode='a', header=False, index=False)
+            (current, _), seconds = timed(schedule.read)
+            report('flights_dash/read_append', len(added), seconds)
+
+            table, seconds = timed(flights_dash.highlight_changes, current, previous)
+            report('flights_dash/highlight_changes', size, seconds)
+            _, seconds = timed(flights_dash.table_page, table, 0, flights_dash.PAGE_SIZE)
+            report('flights_dash/table_page', flights_dash.PAGE_SIZE, seconds)
+
+
+BENCHMARKS = {
+    'export': (bench_export, [1_000, 100_000, 1_000_000]),
+    'kml': (bench_kml_stream, [1_000, 100_000, 1_000_000]),
+    'diff': (bench_diff, [1_000, 10_000, 100_000]),
+    'feed': (bench_feed, [10, 10_000, 1_000_000]),
+    'motion': (bench_motion, [10, 10_000, 1_000_000]),
+    'spatial': (bench_spatial, [1_000, 100_000, 1_000_000]),
+    'highlight': (bench_highlight, [1_000, 50_000, 1_000_000]),
+    'intervals': (bench_intervals, [10_000, 1_000_000]),
+    'dasher': (bench_dasher, [1_000, 100_000]),
+    'ursine': (bench_ursine, [10, 10_000, 1_000_000]),
+    'flights_dash': (bench_flights_dash, [1_000, 100_000, 1_000_000]),
+}
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+    return commit, dirty
+
+
+# Time ratio of each measurement to the same benchmark and size in an earlier results file
+def compare(path):
+    with open(path) as f:
+        before = json.load(f)
+    baseline = {(r['benchmark'], r['rows']): r['seconds'] for r in before['results'] if r.get('seconds')}
+    print(f"\nagainst {before['commit']} ({path}):")
+    for result in results:
+        old = baseline.get((result['benchmark'], result.get('rows')))
+        if old and result.get('seconds'):
+            ratio = result['seconds'] / old
+            flag = '  slower' if ratio > 1.2 else '  faster' if ratio < 1 / 1.2 else ''
+            print(f"{result['benchmark']:<28} {result['rows']:>10,} rows {old:>9.3f} s -> "
+                  f"{result['seconds']:>9.3f} s {ratio:>6.2f}x{flag}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the schedule and feed pipelines on synthetic data")
+    parser.add_argument('benchmarks', nargs='*', help=f"any of: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument('--sizes', type=int, nargs='+', help="override the default sizes")
+    parser.add_argument('--memory', action='store_true',
+                        help="record the peak traced memory of every step (slower timings)")
+    parser.add_argument('--json', help=f"results file (default: {RESULTS_DIR}/<commit>.json)")
+    parser.add_argument('--compare', metavar='JSON', help="print time ratios against an earlier results file")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    if args.memory:
+        tracemalloc.start()
+    for name in args.benchmarks or BENCHMARKS:
+        fn, default_sizes = BENCHMARKS[name]
+        fn(args.sizes or default_sizes)
+    traced = tracemalloc.is_tracing()
+    tracemalloc.stop()
+
+    commit, dirty = git_commit()
+    run = {
+        'commit': commit,
+        'dirty': dirty,
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'traced': traced,
+        'results': results,
+    }
+    path = args.json or os.path.join(RESULTS_DIR, f"{commit}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(run, f, indent=1)
+    print(f"\nresults written to {path}")
+
+    if args.compare:
+        compare(args.compare)
@@ -1,15 +1,25 @@
 import dash
-from dash import dcc, html
+from dash import ctx, dcc, html, no_update
 from dash.dependencies import Input, Output, State
 import dash_bootstrap_components as dbc
-import pandas as pd
 import folium
-import io
-import plotly.express as px
-import base64
-import simplekml
+import pandas as pd
+from flask import Response, abort, request, stream_with_context
+import hashlib
+
+from airports import airport_features, build_airport_index, link_airports, route_segments
+from gantt import gantt_figure, relayout_range
+from instrumentation import diagnostics_panel, instrument, note_rows
+from interval_index import airport_overlaps
+from kml_writer import iter_flight_kml
+from schedule_loader import schedule_intervals
+from upload_cache import UploadCache
 
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+instrument(app)
+
+# Parsed uploads, shared by every callback and the KML download route
+upload_cache = UploadCache()
 
 app.layout = dbc.Container([
     html.H1("Upload CSV and Visualize Data"),
@@ -18,13 +28,24 @@ app.layout = dbc.Container([
         children=dbc.Button('Upload File', id='upload-button', n_clicks=0),
         multiple=False
     ),
+    # Time window in hours from the start of the schedule; only flights in the air during the
+    # window are listed and charted
+    html.Div(id='time-window-label'),
+    dcc.RangeSlider(id='time-window', min=0, max=1, step=1, value=[0, 1], marks=None,
+                    tooltip={'placement': 'bottom'}),
     dbc.Row([
         dbc.Col(dbc.Button("Select All", id='select-all-button', n_clicks=0)),
         dbc.Col(dbc.Checklist(id='flight-selector', options=[], inline=True))
     ]),
+    dcc.Store(id='upload-key'),
+    dcc.Store(id='map-layers'),
+    dcc.Store(id='map-visible'),
     html.Div(id='map-output'),
     html.Div(id='gantt-output'),
-    html.A("Download KML", id='download-link', download="flights.kml", href="", target="_blank")
+    # Re-rendered for the visible range on zoom, so detail is only sent for what is on screen
+    dcc.Graph(id='gantt-chart', style={'display': 'none'}),
+    html.A("Download KML", id='download-link', download="flights.kml", href="", target="_blank"),
+    diagnostics_panel()
 ])
 
 @app.callback(
@@ -39,70 +60,199 @@ def select_all_flights(n_clicks, options, values):
         return []
     return [option['value'] for option in options]
 @app.callback(
-    Output('flight-selector', 'options'),
+    Output('upload-key', 'data'),
+    Output('time-window', 'max'),
+    Output('time-window', 'value'),
     Input('upload-data', 'contents')
 )
 def populate_checklist(contents):
     if contents is None:
         raise dash.exceptions.PreventUpdate
 
-    content_type, content_string = contents.split(',')
-    decoded = io.StringIO(base64.b64decode(content_string).decode('utf-8'))
-    df = pd.read_csv(decoded)
-    return [{'label': f"Flight {num}", 'value': num} for num in df['flight_num']]
+    # Parse once; later callbacks only get the key
+    key = upload_cache.put(contents)
+    intervals = upload_cache.derive(key, 'intervals', schedule_intervals)
+    note_rows(len(intervals))
+    span = intervals.span()
+    hours = max(1, int(-(-(span[1] - span[0]) // pd.Timedelta(hours=1)))) if span else 1
+    return key, hours, [0, hours]
 
-@app.callback([
+# Legs overlapping the slider window, found through the upload's interval index
+def flights_in_window(key, window):
+    df = upload_cache.get(key)
+    intervals = upload_cache.derive(key, 'intervals', schedule_intervals)
+    if df is None or intervals is None:
+        return None, None, None
+    start = intervals.span()[0] if len(intervals) else pd.Timestamp(0)
+    lo, hi = (start + pd.Timedelta(hours=h) for h in (window or [0, 0]))
+    rows = intervals.overlapping(lo, hi)
+    return df.iloc[rows], rows, (lo, hi)
+
+@app.callback(
+    Output('flight-selector', 'options'),
+    Output('time-window-label', 'children'),
+    Input('upload-key', 'data'),
+    Input('time-window', 'value')
+)
+def update_flight_options(key, window):
+    if not key:
+        raise dash.exceptions.PreventUpdate
+
+    df, _, bounds = flights_in_window(key, window)
+    if df is None:
+        return [], "The uploaded file has expired, please upload it again."
+    note_rows(len(df))
+    lo, hi = bounds
+    options = [{'label': f"Flight {num}", 'value': num} for num in df['flight_num']]
+    return options, f"{len(options)} flights in the air between {lo:%Y-%m-%d %H:%M} and {hi:%Y-%m-%d %H:%M}"
+
+# Base map with the airports and one hidden layer per flight route. Rendered once per upload in
+# memory; selection changes only toggle layers in the browser (see the clientside callback below).
+def render_flight_map(df):
+    airports = build_airport_index(df)
+    m = folium.Map(location=[20, 0], zoom_start=2)
+    folium.GeoJson(
+        {'type': 'FeatureCollection', 'features': airport_features(airports)},
+        popup=folium.GeoJsonPopup(fields=['popup'], labels=False),
+    ).add_to(m)
+
+    # one layer per flight number with every leg flown under it, as a multi-polyline
+    segments = {}
+    legs = link_airports(df, airports)
+    for flight, segment in zip(legs['flight_num'].astype(str), route_segments(legs, airports, unique=False)):
+        segments.setdefault(flight, []).append(segment)
+
+    layers = {}
+    for flight, lines in segments.items():
+        layer = folium.FeatureGroup(name=f"Flight {flight}", show=False)
+        folium.PolyLine(lines, color="blue").add_to(layer)
+        layer.add_to(m)
+        layers[flight] = layer.get_name()
+
+    return m.get_root().render(), {'map': m.get_name(), 'flights': layers}
+
+@app.callback(
     Output('map-output', 'children'),
+    Output('map-layers', 'data'),
+    Input('upload-key', 'data')
+)
+def update_map(key):
+    if not key:
+        raise dash.exceptions.PreventUpdate
+
+    rendered = upload_cache.derive(key, 'map', render_flight_map)
+    if rendered is None:
+        return html.Div("The uploaded file has expired, please upload it again."), None
+
+    map_html, layers = rendered
+    return html.Iframe(id='map', srcDoc=map_html, width='100%', height='500'), layers
+
+# Show the selected flights' layers inside the map iframe; no server round trip
+app.clientside_callback(
+    """
+    function(selected, layers) {
+        if (!layers) {
+            return window.dash_clientside.no_update;
+        }
+        const frame = document.getElementById('map');
+        const visible = new Set((selected || []).map(String));
+        const apply = function() {
+            const win = frame && frame.contentWindow;
+            const map = win && win[layers.map];
+            if (!map) {
+                return false;
+            }
+            Object.entries(layers.flights).forEach(function([flight, name]) {
+                if (visible.has(flight)) {
+                    map.addLayer(win[name]);
+                } else {
+                    map.removeLayer(win[name]);
+                }
+            });
+            return true;
+        };
+        if (frame && !apply()) {
+            frame.addEventListener('load', apply, {once: true});
+        }
+        return visible.size;
+    }
+    """,
+    Output('map-visible', 'data'),
+    Input('flight-selector', 'value'),
+    Input('map-layers', 'data')
+)
+
+@app.callback([
     Output('gantt-output', 'children'),
+    Output('gantt-chart', 'figure'),
+    Output('gantt-chart', 'style'),
     Output('download-link', 'href')
 ],
-[Input('flight-selector', 'value')],
-[State('upload-data', 'contents')]
+[Input('flight-selector', 'value'),
+ Input('time-window', 'value'),
+ Input('gantt-chart', 'relayoutData')],
+[State('upload-key', 'data')]
 )
-def update_visualization(selected_flights, contents):
-    if not contents or not selected_flights:
+def update_visualization(selected_flights, window, relayout_data, key):
+    if not key or not selected_flights:
         raise dash.exceptions.PreventUpdate
 
-    content_type, content_string = contents.split(',')
-    decoded = io.StringIO(base64.b64decode(content_string).decode('utf-8'))
-    df = pd.read_csv(decoded)
-    
-    # Filter dataframe for selected flights
-    df = df[df['flight_num'].isin(selected_flights)]
+    df, _, bounds = flights_in_window(key, window)
+    if df is None:
+        return html.Div("The uploaded file has expired, please upload it again."), {}, {'display': 'none'}, ""
 
-    # Create folium map
-    m = folium.Map(location=[20, 0], zoom_start=2)
-    for _, row in df.iterrows():
-        folium.Marker(
-            [row['src_lat'], row['src_lng']], 
-            popup=f"From: {row['src_name']}\nFlight Number: {row['flight_num']}\nDeparture: {row['departure_date']}"
-        ).add_to(m)
-        folium.Marker(
-            [row['dst_lat'], row['dst_long']], 
-            popup=f"To: {row['dest_name']}\nFlight Number: {row['flight_num']}\nArrival: {row['arrival_date']}"
-        ).add_to(m)
-        folium.PolyLine([(row['src_lat'], row['src_lng']), (row['dst_lat'], row['dst_long'])], color="blue").add_to(m)
-    m.save('map.html')
-
-    # Create Gantt chart
-    df['Start'] = pd.to_datetime(df['departure_date'])
-    df['Finish'] = pd.to_datetime(df['arrival_date'])
-    fig = px.timeline(df, x_start="Start", x_end="Finish", y="flight_num", title="Flight Schedule Gantt Chart", hover_data=df.columns)
-
-    # Create KML
-    kml_content = generate_kml(df)
-    kml_data_uri = "data:text/xml;charset=utf-8," + kml_content
-    
-    return html.Iframe(id='map', srcDoc=open('map.html', 'r').read(), width='100%', height='500'), dcc.Graph(figure=fig), kml_data_uri
-
-def generate_kml(df):
-    kml = simplekml.Kml()
-    for _, row in df.iterrows():
-        point_src = kml.newpoint(name=row['src_name'], coords=[(row['src_lng'], row['src_lat'])])
-        point_dest = kml.newpoint(name=row['dest_name'], coords=[(row['dst_long'], row['dst_lat'])])
-        linestring = kml.newlinestring(name=f"Flight {row['flight_num']}", coords=[(row['src_lng'], row['src_lat']), (row['dst_long'], row['dst_lat'])])
-    
-    return kml.kml()
+    # Zooming re-renders only the zoomed range (within the slider window)
+    view = bounds
+    zoomed = ctx.triggered_id == 'gantt-chart'
+    if zoomed:
+        zoom = relayout_range(relayout_data)
+        if zoom is None:
+            raise dash.exceptions.PreventUpdate
+        if zoom != 'autorange':
+            view = (max(zoom[0], bounds[0]), min(zoom[1], bounds[1]))
+
+    # Selected flights in view; legs departing or arriving within minutes of another leg at the
+    # same airport are flagged
+    intervals = upload_cache.derive(key, 'intervals', schedule_intervals)
+    overlaps = upload_cache.derive(key, 'airport_overlaps', airport_overlaps)
+    rows = intervals.overlapping(*view)
+    legs = upload_cache.get(key).iloc[rows].assign(airport_overlap=overlaps[rows])
+    legs = legs[legs['flight_num'].isin(selected_flights)]
+    note_rows(len(legs))
+
+    # Create Gantt chart, one bar per flight or grouped into lanes depending on how many are in view
+    fig = gantt_figure(legs, view)
+
+    # KML is streamed by the download route for the same selection, kept server-side so the URL
+    # stays short however many flights are selected
+    kml_href = no_update if zoomed else f"/download/{key}/flights.kml?selection={store_selection(key, selected_flights)}"
+
+    return None, fig, {'display': 'block'}, kml_href
+
+# Remember a selection of flights next to its upload; returns the key it is stored under
+def store_selection(key, selected_flights):
+    flights = sorted({str(flight) for flight in selected_flights})
+    selection = hashlib.sha256('\n'.join(flights).encode('utf-8')).hexdigest()[:16]
+    upload_cache.derive(key, ('selection', selection), lambda df: flights)
+    return selection
+
+@app.server.route('/download/<key>/flights.kml')
+def download_kml(key):
+    df = upload_cache.get(key)
+    if df is None:
+        abort(404)
+    selection = request.args.get('selection')
+    if selection:
+        flights = upload_cache.derived(key, ('selection', selection))
+        if flights is None:
+            abort(404)
+        df = df[df['flight_num'].astype(str).isin(flights)]
+    return Response(stream_with_context(iter_flight_kml(df)),
+                    mimetype='application/vnd.google-earth.kml+xml',
+                    headers={'Content-Disposition': 'attachment; filename=flights.kml'})
+
+def generate_kml(df, airports=None):
+    return ''.join(iter_flight_kml(df, airports=airports))
 
 if __name__ == '__main__':
     app.run_server(debug=True)
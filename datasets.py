@@ -0,0 +1,67 @@
+import os
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+# Local columnar copies of CSV datasets. The first load parses the CSV (a local path, or a URL
+# fetched once) with the given read_csv options, e.g. categorical dtypes, and writes an
+# uncompressed Feather file; later loads memory-map that file instead of parsing. A cache built
+# from a local CSV is rebuilt when the CSV is newer than it.
+
+
+def is_url(source):
+    return urlparse(str(source)).scheme in ('http', 'https', 'ftp')
+
+
+def cache_is_fresh(source, cache_path):
+    if not os.path.exists(cache_path):
+        return False
+    if is_url(source) or not os.path.exists(source):
+        return True
+    return os.path.getmtime(cache_path) >= os.path.getmtime(source)
+
+
+def write_cache(df, cache_path):
+    os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+    partial = cache_path + '.partial'
+    feather.write_feather(df.reset_index(drop=True), partial, compression='uncompressed')
+    os.replace(partial, cache_path)  # readers never see a half-written cache
+
+
+# `prepare(df)`, if given, is applied to the parsed CSV before it is cached
+def load_cached(source, cache_path, prepare=None, **read_csv_kwargs):
+    if cache_is_fresh(source, cache_path):
+        return feather.read_table(cache_path, memory_map=True).to_pandas()
+    df = pd.read_csv(source, **read_csv_kwargs)
+    if prepare is not None:
+        df = prepare(df)
+    write_cache(df, cache_path)
+    return df
+
+
+# Row positions per value of a categorical column, built in one pass, so filtering to one value
+# is a slice of a precomputed array instead of a comparison over every row
+class CategoryIndex:
+    def __init__(self, df, column):
+        self.df = df
+        values = df[column].astype('category')
+        codes = values.cat.codes.to_numpy()
+        self.categories = values.cat.categories
+        self.order = np.argsort(codes, kind='stable')
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.categories))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]) + int((codes < 0).sum())
+
+    # Values present in the column, in category order
+    def values(self):
+        return self.categories[np.diff(self.offsets) > 0].tolist()
+
+    def rows(self, value):
+        code = self.categories.get_indexer([value])[0]
+        if code < 0:
+            return self.order[:0]
+        return self.order[self.offsets[code]:self.offsets[code + 1]]
+
+    def frame(self, value):
+        return self.df.iloc[self.rows(value)]
@@ -1,102 +1,183 @@
 # Import necessary libraries
 import dash
-from dash import dcc, html
-from dash.dependencies import Input, Output
+from dash import ctx, dcc, html, no_update
+from dash.dependencies import Input, Output, State
+from dash.dash_table import DataTable
 import pandas as pd
+import threading
 import time
+import uuid
+from collections import OrderedDict
+
+from instrumentation import diagnostics_panel, instrument, note_rows
+from schedule_loader import decimal_frame, read_schedule
+from snapshot_diff import status_frame
+from watched_csv import WatchedCSV
 
 # Initialize the Dash app
 app = dash.Dash(__name__)
+instrument(app)
 
 UPDATE_INTERVAL = 10
+PAGE_SIZE = 50
+MAX_SESSIONS = 256
+
+# Row colours per change status, as DataTable conditional styles
+STATUS_STYLES = [
+    {'if': {'filter_query': '{status} = "added"'}, 'backgroundColor': 'green', 'color': 'white'},
+    {'if': {'filter_query': '{status} = "removed"'}, 'backgroundColor': 'red', 'color': 'white'},
+    {'if': {'filter_query': '{status} = "modified"'}, 'backgroundColor': 'gold'},
+]
 
 # Global variable to store previous data
 global previous_df
 previous_df = pd.DataFrame()
 
-# Variable to store the next update timestamp
-global next_update_time
-next_update_time = time.time() + UPDATE_INTERVAL
-
-# Layout of the Dash app
-app.layout = html.Div([
-    dcc.Interval(
-        id='data-interval-component',
-        interval=UPDATE_INTERVAL * 1000,
-        n_intervals=0
-    ),
-    dcc.Interval(
-        id='countdown-interval-component',
-        interval=1 * 1000,
-        n_intervals=0
-    ),
-    html.H1("CSV Data Dashboard"),
-    html.Div(id='csv-data'),
-    html.P(id='update-time'),
-])
-
-# Function to read CSV data
+# Schedule rows with their change status, shared by every session. A change stays highlighted
+# for one refresh interval, then the table is replaced by the plain file; each replacement gets
+# a new table_version.
+global table_df
+table_df = pd.DataFrame()
+table_version = 0
+highlighted_until = None
+table_lock = threading.Lock()
+
+# Table version each browser session last received, so unchanged ticks send nothing
+shown_versions = OrderedDict()
+
+# Layout of the Dash app, built per page load so each browser session gets its own id
+def serve_layout():
+    return html.Div([
+        dcc.Interval(
+            id='data-interval-component',
+            interval=UPDATE_INTERVAL * 1000,
+            n_intervals=0
+        ),
+        # Ticks the countdown label in the browser only; no callback on it reaches the server
+        dcc.Interval(
+            id='countdown-interval-component',
+            interval=1 * 1000,
+            n_intervals=0
+        ),
+        # Server time and next refresh time (ms since the epoch), published with each refresh
+        dcc.Store(id='next-refresh'),
+        html.H1("CSV Data Dashboard"),
+        # Only the visible page is sent; rows are coloured by the status column
+        DataTable(id='csv-data',
+                  style_data_conditional=STATUS_STYLES,
+                  page_action='custom',
+                  page_current=0,
+                  page_size=PAGE_SIZE),
+        html.P(id='update-time'),
+        diagnostics_panel(),
+        # Identifies this page load for shown_versions
+        dcc.Store(id='session-id', data=str(uuid.uuid4())),
+    ])
+
+app.layout = serve_layout
+
+# schedule.csv is only parsed again when it changes, and appended rows are parsed on their own
+schedule = WatchedCSV('schedule.csv', read=read_schedule)
+
+# Function to read CSV data, plus whether it changed since the last read
 def read_csv_data():
-    return pd.read_csv('schedule.csv')
+    return schedule.read()
 
-# Function to compare dataframes and highlight changes
+# Function to compare dataframes and highlight changes: rows matched on flight_num (a repeated
+# number by order of appearance) in one vectorised pass, each marked added, modified or
+# unchanged, then the removed rows
 def highlight_changes(current_df, previous_df):
-    # Generate HTML from the current dataframe
-    current_html = current_df.to_html()
-
-    # Find new and removed items
-    new_items = current_df[~current_df.isin(previous_df)].dropna()
-    removed_items = previous_df[~previous_df.isin(current_df)].dropna()
-
-    # Apply HTML styling for new and removed items
-    for row_index in new_items.index:
-        current_html = current_html.replace(f'<tr>', f'<tr style="background-color: green;">', 1)
-
-    for row_index in removed_items.index:
-        current_html = current_html.replace(f'<tr>', f'<tr style="background-color: red;">', 1)
-
-    return current_html
-
-    
-# Callback to update the data
-@app.callback(Output('csv-data', 'children'), Input('data-interval-component', 'n_intervals'))
-def update_data(n):
-    global next_update_time, previous_df
-    current_df = read_csv_data()
-    
-    # Compare and highlight changes
-    csv_data = highlight_changes(current_df, previous_df)
-    
-    # Update previous dataframe
-    previous_df = current_df.copy()
-
-    # Render the HTML using Markdown
-    markdown_content = dcc.Markdown(csv_data, dangerously_allow_html=True)
-
-    # Calculate remaining time until the next update
-    current_time = time.time()
-    remaining_seconds = int(next_update_time - current_time)
-    
-    # If it's time for the next update, update next_update_time
-    if remaining_seconds <= 0:
-        next_update_time = current_time + UPDATE_INTERVAL
-    
-    return markdown_content
-
-
-# Callback to update the countdown timer
-@app.callback(Output('update-time', 'children'), Input('countdown-interval-component', 'n_intervals'))
-def update_countdown(n):
-    global next_update_time
-    current_time = time.time()
-    remaining_seconds = int(next_update_time - current_time)
-
-    if remaining_seconds <= 0:
-        next_update_time = current_time + UPDATE_INTERVAL
-
-    time_until_next_update = f"Next refresh in: {remaining_seconds} seconds"
-
-    return time_until_next_update
+    return status_frame(previous_df, current_df, key='flight_num')
+
+def table_page(df, page_current, page_size):
+    start = page_current * page_size
+    return decimal_frame(df.iloc[start:start + page_size]).to_dict('records')
+
+# Re-read schedule.csv and bring the shared table up to date: highlight a change, or drop the
+# highlights once they have been shown for an interval
+def refresh_table():
+    global previous_df, table_df, table_version, highlighted_until
+    with table_lock:
+        current_df, changed = read_csv_data()
+        now = time.time()
+        if changed:
+            # Compare and highlight changes
+            table_df = highlight_changes(current_df, previous_df)
+            highlighted_until = now + UPDATE_INTERVAL
+        elif highlighted_until is not None and now >= highlighted_until:
+            table_df = highlight_changes(current_df, current_df)
+            highlighted_until = None
+        else:
+            return table_df, table_version
+        # Update previous dataframe (WatchedCSV never modifies a frame it has returned)
+        previous_df = current_df
+        table_version += 1
+        note_rows(len(table_df))
+        return table_df, table_version
+
+# Whether `session_id` already has `version` on screen; records it as shown otherwise
+def already_shown(session_id, version):
+    with table_lock:
+        if shown_versions.get(session_id) == version:
+            return True
+        shown_versions[session_id] = version
+        shown_versions.move_to_end(session_id)
+        while len(shown_versions) > MAX_SESSIONS:
+            shown_versions.popitem(last=False)
+        return False
+
+# Callback to update the data, one page at a time
+@app.callback([Output('csv-data', 'data'),
+               Output('csv-data', 'columns'),
+               Output('csv-data', 'page_count'),
+               Output('next-refresh', 'data')],
+              [Input('data-interval-component', 'n_intervals'),
+               Input('csv-data', 'page_current')],
+              [State('session-id', 'data')])
+def update_data(n, page_current, session_id):
+    page_current = page_current or 0
+    next_refresh = no_update
+    df, version = refresh_table()
+
+    if ctx.triggered_id in (None, 'data-interval-component'):
+        # The data interval just started (page load) or fired: the next refresh is one interval away
+        current_time = time.time()
+        next_refresh = {'now': current_time * 1000, 'next': (current_time + UPDATE_INTERVAL) * 1000}
+
+    if ctx.triggered_id == 'data-interval-component':
+        # This session already shows this version of the table: nothing to send
+        if already_shown(session_id, version):
+            return no_update, no_update, no_update, next_refresh
+    else:
+        # initial call or page change: the page is always sent
+        already_shown(session_id, version)
+
+    columns = [{"name": i, "id": i} for i in df.columns]
+    page_count = max(1, -(-len(df) // PAGE_SIZE))
+    return table_page(df, page_current, PAGE_SIZE), columns, page_count, next_refresh
+
+
+# Countdown computed in the browser from the published refresh time. The server's clock is
+# mapped to the browser's when a new time arrives, so clock skew doesn't shift the countdown.
+app.clientside_callback(
+    """
+    function(n, refresh) {
+        if (!refresh) {
+            return window.dash_clientside.no_update;
+        }
+        const state = window._nextRefresh = window._nextRefresh || {};
+        if (state.next !== refresh.next) {
+            state.next = refresh.next;
+            state.offset = refresh.now - Date.now();
+        }
+        const remaining = Math.max(0, Math.round((refresh.next - state.offset - Date.now()) / 1000));
+        return `Next refresh in: ${remaining} seconds`;
+    }
+    """,
+    Output('update-time', 'children'),
+    Input('countdown-interval-component', 'n_intervals'),
+    Input('next-refresh', 'data')
+)
 
 if __name__ == '__main__':
     app.run_server(debug=True)
@@ -0,0 +1,78 @@
+import pandas as pd
+import plotly.express as px
+
+# Level-of-detail Gantt chart for dasher.py. Up to MAX_BARS legs in view are drawn one bar per
+# flight with every column in the hover. Past that, legs are grouped into lanes (per route, or per
+# departure airport when there are too many routes) and time buckets sized so that the chart
+# never holds more than about MAX_BARS bars, whatever the size of the selection. Hover details
+# only ever cover the legs inside the visible window.
+
+MAX_BARS = 400
+MAX_LANES = 40
+OVERLAP_COLORS = {True: 'crimson', False: 'steelblue'}
+
+
+def detailed_timeline(legs):
+    legs = legs.assign(Start=legs['departure_date'], Finish=legs['arrival_date'])
+    return px.timeline(legs, x_start="Start", x_end="Finish", y="flight_num",
+                       title="Flight Schedule Gantt Chart", hover_data=legs.columns,
+                       color='airport_overlap', color_discrete_map=OVERLAP_COLORS)
+
+
+# Lane of each leg: its route, its departure airport when there are too many routes, and the
+# busiest MAX_LANES - 1 of those plus "other airports" when there are still too many
+def lanes(legs, max_lanes=MAX_LANES):
+    src, dst = legs['src_name'].astype(str), legs['dest_name'].astype(str)
+    lane = src + ' → ' + dst
+    if lane.nunique() > max_lanes:
+        lane = 'from ' + src
+    if lane.nunique() > max_lanes:
+        busiest = lane.value_counts().index[:max_lanes - 1]
+        lane = lane.where(lane.isin(busiest), 'other airports')
+    return lane
+
+
+def aggregated_timeline(legs, view, max_bars=MAX_BARS, max_lanes=MAX_LANES):
+    lane = lanes(legs, max_lanes)
+    buckets = max(1, max_bars // lane.nunique())
+    lo, hi = (pd.Timestamp(t) for t in view)
+    width = max((hi - lo) / buckets, pd.Timedelta(minutes=1))
+    bucket = ((legs['departure_date'] - lo) // width).clip(0, buckets - 1).to_numpy()
+
+    bars = legs.assign(lane=lane.to_numpy(), bucket=bucket).groupby(['lane', 'bucket']).agg(
+        Start=('departure_date', 'min'),
+        Finish=('arrival_date', 'max'),
+        flights=('flight_num', 'size'),
+        overlapping=('airport_overlap', 'sum'),
+    ).reset_index()
+    bars['airport_overlap'] = bars['overlapping'] > 0
+
+    fig = px.timeline(bars, x_start="Start", x_end="Finish", y="lane",
+                      title=f"Flight Schedule Gantt Chart ({len(legs):,} flights grouped, zoom in for detail)",
+                      hover_data={'flights': True, 'overlapping': True, 'airport_overlap': False, 'bucket': False},
+                      color='airport_overlap', color_discrete_map=OVERLAP_COLORS)
+    return fig
+
+
+# Chart of the legs overlapping `view` (lo, hi), at the level of detail their count allows
+def gantt_figure(legs, view, max_bars=MAX_BARS):
+    if len(legs) <= max_bars:
+        fig = detailed_timeline(legs)
+    else:
+        fig = aggregated_timeline(legs, view, max_bars)
+    fig.update_xaxes(range=[pd.Timestamp(view[0]), pd.Timestamp(view[1])])
+    return fig
+
+
+# (lo, hi) of a zoom from a timeline's relayoutData; 'autorange' when zoomed back out, None if
+# the event is not an x-axis change
+def relayout_range(relayout_data):
+    relayout_data = relayout_data or {}
+    if relayout_data.get('xaxis.autorange'):
+        return 'autorange'
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        return pd.Timestamp(relayout_data['xaxis.range[0]']), pd.Timestamp(relayout_data['xaxis.range[1]'])
+    if 'xaxis.range' in relayout_data:
+        lo, hi = relayout_data['xaxis.range']
+        return pd.Timestamp(lo), pd.Timestamp(hi)
+    return None
@@ -0,0 +1,208 @@
+import bisect
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+
+import dash
+from dash import dcc, html
+from dash.dependencies import Input, Output
+from flask import Response, abort, g, has_request_context, request
+
+# Opt-in per-callback metrics for the Dash apps. With DASH_METRICS=1, instrument(app) wraps every
+# callback registered after it to record wall time, the rows it processed (when the callback calls
+# note_rows()) and the bytes of its JSON response, each into a histogram with fixed log-spaced
+# buckets. The histograms are served as JSON on /_metrics (local requests only) and shown in a
+# collapsed panel from diagnostics_panel(). Without DASH_METRICS nothing is wrapped or registered.
+
+ENABLED = os.environ.get('DASH_METRICS', '0') not in ('', '0')
+METRICS_PATH = '/_metrics'
+PANEL_INTERVAL = 5  # seconds between diagnostics panel refreshes
+
+SECONDS_EDGES = [0.0005 * 2 ** i for i in range(18)]  # 0.5 ms .. about 65 s
+ROWS_EDGES = [10 ** i for i in range(9)]
+BYTES_EDGES = [256 * 4 ** i for i in range(12)]  # 256 B .. 1 GiB
+
+_rows = contextvars.ContextVar('callback_rows', default=None)
+
+
+# Counts of values per bucket; bucket i holds values <= edges[i], the last one everything above
+class Histogram:
+    def __init__(self, edges):
+        self.edges = edges
+        self.counts = [0] * (len(edges) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.edges, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    # Upper edge of the bucket holding the q-quantile (the maximum for the overflow bucket)
+    def quantile(self, q):
+        if not self.count:
+            return None
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= q * self.count:
+                return min(self.edges[i], self.max) if i < len(self.edges) else self.max
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'mean': self.mean(),
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'max': self.max,
+            'buckets': [[edge, n] for edge, n in zip(self.edges + ['+Inf'], self.counts) if n],
+        }
+
+
+class CallbackStats:
+    def __init__(self):
+        self.seconds = Histogram(SECONDS_EDGES)
+        self.rows = Histogram(ROWS_EDGES)
+        self.bytes = Histogram(BYTES_EDGES)
+        self.prevented = 0
+        self.errors = 0
+
+    def as_dict(self):
+        return {'seconds': self.seconds.as_dict(), 'rows': self.rows.as_dict(), 'bytes': self.bytes.as_dict(),
+                'prevented': self.prevented, 'errors': self.errors}
+
+
+# Stats of one app's callbacks, by function name
+class AppMetrics:
+    def __init__(self):
+        self.callbacks = {}
+        self.lock = threading.Lock()
+
+    def stats_for(self, name):
+        with self.lock:
+            return self.callbacks.setdefault(name, CallbackStats())
+
+    def snapshot(self):
+        with self.lock:
+            return {name: stats.as_dict() for name, stats in sorted(self.callbacks.items())}
+
+
+# Record how many rows the running callback processed; a no-op unless metrics are enabled
+def note_rows(rows):
+    if ENABLED:
+        _rows.set(int(rows))
+
+
+def timed_callback(fn, metrics):
+    name = fn.__name__
+    stats = metrics.stats_for(name)
+    lock = metrics.lock
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _rows.set(None)
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except dash.exceptions.PreventUpdate:
+            with lock:
+                stats.prevented += 1
+            raise
+        except Exception:
+            with lock:
+                stats.errors += 1
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            rows = _rows.get()
+            _rows.reset(token)
+        with lock:
+            stats.seconds.add(seconds)
+            if rows is not None:
+                stats.rows.add(rows)
+        if has_request_context():
+            g.metrics_callback = name  # response size is added once dash has serialised it
+        return result
+
+    return wrapper
+
+
+# Size of each callback response, as sent
+def record_response_bytes(metrics, response):
+    name = g.get('metrics_callback')
+    if name is not None and response.status_code == 200:
+        size = response.calculate_content_length()
+        if size is not None:
+            stats = metrics.stats_for(name)
+            with metrics.lock:
+                stats.bytes.add(size)
+    return response
+
+
+def serve_metrics(metrics):
+    if request.remote_addr not in ('127.0.0.1', '::1'):
+        abort(404)
+    return Response(json.dumps(metrics.snapshot(), indent=1), mimetype='application/json')
+
+
+def describe(metrics):
+    def ms(value):
+        return '-' if value is None else f"{value * 1e3:,.1f}"
+
+    def mean(value, scale=1):
+        return '-' if value is None else f"{value / scale:,.0f}"
+
+    lines = [f"{'callback':<28} {'calls':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'rows':>9} "
+             f"{'KiB':>8} {'skipped':>7} {'errors':>6}"]
+    for name, m in metrics.items():
+        seconds = m['seconds']
+        lines.append(f"{name:<28} {seconds['count']:>6} {ms(seconds['p50']):>9} {ms(seconds['p95']):>9} "
+                     f"{ms(seconds['max'] if seconds['count'] else None):>9} {mean(m['rows']['mean']):>9} "
+                     f"{mean(m['bytes']['mean'], 2**10):>8} {m['prevented']:>7} {m['errors']:>6}")
+    return '\n'.join(lines)
+
+
+# Wrap the callbacks registered on `app` from now on and add the metrics route; call it right
+# after creating the app. Does nothing unless DASH_METRICS is set.
+def instrument(app):
+    if not ENABLED:
+        return app
+    metrics = app.metrics = AppMetrics()
+    register = app.callback
+
+    def callback(*args, **kwargs):
+        decorate = register(*args, **kwargs)
+        return lambda fn: decorate(timed_callback(fn, metrics))
+
+    app.callback = callback
+    app.server.after_request(functools.partial(record_response_bytes, metrics))
+    app.server.add_url_rule(METRICS_PATH, 'dash_metrics', functools.partial(serve_metrics, metrics))
+
+    # the panel's own refreshes are left out of the metrics
+    @register(Output('metrics-table', 'children'),
+              [Input('metrics-interval', 'n_intervals')])
+    def update_metrics_panel(n):
+        return describe(metrics.snapshot())
+
+    return app
+
+
+# Collapsed panel with the metrics table, for the app layout; empty unless DASH_METRICS is set
+def diagnostics_panel():
+    if not ENABLED:
+        return html.Div()
+    return html.Details([
+        html.Summary("Diagnostics"),
+        html.Pre(id='metrics-table', style={'fontSize': 'small'}),
+        dcc.Interval(id='metrics-interval', interval=PANEL_INTERVAL * 1000, n_intervals=0),
+    ])
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+# Time-interval index over schedule legs (departure -> arrival). Legs are sorted by start once;
+# since no leg is longer than the longest one, every leg overlapping [lo, hi] starts within
+# [lo - longest, hi], so a query is two binary searches plus a check of the end times in that
+# window rather than a scan of the whole schedule.
+
+SEPARATION = pd.Timedelta(minutes=15)  # minimum gap between movements at one airport
+
+
+def as_int64(times):
+    return pd.to_datetime(pd.Series(times)).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+
+
+class TimeIntervals:
+    def __init__(self, starts, ends):
+        starts, ends = as_int64(starts), as_int64(ends)
+        self.order = np.argsort(starts, kind='stable')
+        self.starts = starts[self.order]
+        self.ends = ends[self.order]
+        self.longest = int((self.ends - self.starts).max()) if len(starts) else 0
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def nbytes(self):
+        return self.order.nbytes + self.starts.nbytes + self.ends.nbytes
+
+    def span(self):
+        if not len(self):
+            return None
+        return pd.Timestamp(self.starts[0]), pd.Timestamp(int(self.ends.max()))
+
+    # Positions (in the indexed frame, ascending) of the legs overlapping [lo, hi], ends included
+    def overlapping(self, lo, hi):
+        lo, hi = pd.Timestamp(lo).value, pd.Timestamp(hi).value
+        first = np.searchsorted(self.starts, lo - self.longest, side='left')
+        last = np.searchsorted(self.starts, hi, side='right')
+        window = np.arange(first, last)
+        return np.sort(self.order[window[self.ends[first:last] >= lo]])
+
+    # Legs in the air (or on the ground at either end) at `time`
+    def at(self, time):
+        return self.overlapping(time, time)
+
+
+# Whether each leg departs or arrives within `separation` of another leg's departure or arrival
+# at the same airport (its departure counts at its source airport, its arrival at its
+# destination). One sort of these events by (airport, time); a leg has at most two events at an
+# airport, so the nearest event of another leg is at most two places away in that order.
+def airport_overlaps(df, src='src_name', dst='dest_name', separation=SEPARATION):
+    legs = np.arange(len(df))
+    airports = pd.concat([df[src].astype(str), df[dst].astype(str)], ignore_index=True)
+    events = pd.DataFrame({
+        'airport': pd.factorize(airports)[0],
+        'leg': np.concatenate([legs, legs]),
+        'time': np.concatenate([as_int64(df['departure_date']), as_int64(df['arrival_date'])]),
+    }).sort_values(['airport', 'time'], kind='stable')
+
+    airport, leg, time = (events[c].to_numpy() for c in ('airport', 'leg', 'time'))
+    window = pd.Timedelta(separation).value
+    flagged = np.zeros(len(df), dtype=bool)
+    for shift in (1, 2):
+        a, b = slice(0, len(events) - shift), slice(shift, len(events))
+        close = (airport[a] == airport[b]) & (leg[a] != leg[b]) & (time[b] - time[a] < window)
+        flagged[leg[a][close]] = True
+        flagged[leg[b][close]] = True
+    return flagged
@@ -0,0 +1,106 @@
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+from airports import build_airport_index
+
+# Streaming KML emitter. Produces the same Document / Placemark / Point / LineString layout
+# (and the same id numbering) as simplekml, but one chunk of rows at a time, so memory stays
+# bounded by the chunk size rather than by the whole schedule.
+
+KML_HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2">\n'
+              '    <Document id="1">\n')
+KML_FOOTER = ('    </Document>\n'
+              '</kml>\n')
+
+CHUNK_SIZE = 10_000
+
+
+def escape_xml(values):
+    return (values.astype(str)
+            .str.replace('&', '&amp;', regex=False)
+            .str.replace('<', '&lt;', regex=False)
+            .str.replace('>', '&gt;', regex=False)
+            .str.replace('"', '&quot;', regex=False))
+
+
+def kml_coordinates(lng, lat):
+    return lng.astype(str) + ',' + lat.astype(str) + ',0.0'
+
+
+# One Point placemark per unique airport, described by its aggregated departures/arrivals
+def airport_placemarks(airports):
+    return pd.DataFrame({
+        'name': airports.index.get_level_values('name'),
+        'geometry': 'Point',
+        'coordinates': kml_coordinates(pd.Series(airports.index.get_level_values('lng')),
+                                       pd.Series(airports.index.get_level_values('lat'))),
+        'description': airports['summary'].to_numpy(),
+    })
+
+
+# One LineString placemark per flight; descriptions come from the prepared columns when present
+def route_placemarks(df):
+    src = kml_coordinates(df['src_lng'], df['src_lat'])
+    dst = kml_coordinates(df['dst_long'], df['dst_lat'])
+    route_name = df['route_name'] if 'route_name' in df else 'Flight ' + df['flight_num'].astype(str)
+    return pd.DataFrame({'name': route_name, 'geometry': 'LineString', 'coordinates': src + ' ' + dst,
+                         'description': df.get('route_description')})
+
+
+# Serialize one frame of placemark rows (name, geometry, coordinates, optional description)
+def render_placemarks(placemarks, first_id):
+    geometry_id = pd.Series(first_id + 2 * np.arange(len(placemarks)), index=placemarks.index).astype(str)
+    placemark_id = pd.Series(first_id + 1 + 2 * np.arange(len(placemarks)), index=placemarks.index).astype(str)
+
+    description = placemarks['description'] if 'description' in placemarks else None
+    if description is None or description.isna().all():
+        description = ''
+    else:
+        description = ('            <description>' + escape_xml(description) + '</description>\n').where(
+            description.notna(), '')
+
+    xml = ('        <Placemark id="' + placemark_id + '">\n'
+           '            <name>' + escape_xml(placemarks['name']) + '</name>\n'
+           + description
+           + '            <' + placemarks['geometry'] + ' id="' + geometry_id + '">\n'
+           '                <coordinates>' + placemarks['coordinates'] + '</coordinates>\n'
+           '            </' + placemarks['geometry'] + '>\n'
+           '        </Placemark>\n')
+    return ''.join(xml.tolist())
+
+
+# Yield the KML document as text chunks. `frames` is any iterable of placemark frames, e.g.
+# route_placemarks() applied to slices of a schedule or to pd.read_csv(..., chunksize=...).
+def iter_kml(frames):
+    yield KML_HEADER
+    next_id = 2
+    for placemarks in frames:
+        if len(placemarks):
+            yield render_placemarks(placemarks, next_id)
+            next_id += 2 * len(placemarks)
+    yield KML_FOOTER
+
+
+def iter_slices(df, chunk_size=CHUNK_SIZE):
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+
+# Airports first (deduplicated), then the routes a chunk at a time
+def iter_flight_kml(df, chunk_size=CHUNK_SIZE, airports=None):
+    if airports is None:
+        airports = build_airport_index(df)
+    routes = (route_placemarks(chunk) for chunk in iter_slices(df, chunk_size))
+    return iter_kml(chain([airport_placemarks(airports)], routes))
+
+
+# Write chunks to a path or an open text file
+def write_kml(chunks, path_or_file):
+    if hasattr(path_or_file, 'write'):
+        path_or_file.writelines(chunks)
+        return
+    with open(path_or_file, 'w', encoding='utf-8') as f:
+        f.writelines(chunks)
@@ -1,53 +1,99 @@
+import os  # local dataset paths
 import time  # to simulate a real time data, time loop
 
 import numpy as np  # np mean, np random
 import pandas as pd  # read csv, df manipulation
 import plotly.express as px  # interactive charts
+import plotly.graph_objects as go  # heatmap from precomputed bins
 import streamlit as st  # 🎈 data web app development
 
+from aggregates import Bins, Bins2D, Count, Mean  # KPIs and charts without rescanning the frame
+from datasets import CategoryIndex, load_cached  # local columnar cache, per-job row index
+
 st.set_page_config(
     page_title="Real-Time Data Science Dashboard",
     page_icon="✅",
     layout="wide",
 )
 
-# read csv from a github repo
+# read csv from a github repo, unless there is a local copy (BANK_CSV or ./bank.csv)
 dataset_url = "https://raw.githubusercontent.com/Lexie88rus/bank-marketing-analysis/master/bank.csv"
+dataset_path = os.environ.get("BANK_CSV", "bank.csv")
+
+# parsed once into a memory-mapped Feather cache, so restarts work offline and skip the CSV
+DATA_CACHE = os.environ.get("BANK_CACHE", os.path.join("data", "bank.feather"))
+CATEGORICAL_COLUMNS = ["job", "marital", "education", "default", "housing", "loan",
+                       "contact", "month", "poutcome", "deposit"]
+
 
-# read csv from a URL
-@st.experimental_memo
+# loaded once per server process and shared by every session
+@st.cache_resource
 def get_data() -> pd.DataFrame:
-    return pd.read_csv(dataset_url)
+    source = dataset_path if os.path.exists(dataset_path) else dataset_url
+    return load_cached(source, DATA_CACHE,
+                       dtype={column: "category" for column in CATEGORICAL_COLUMNS})
+
+
+# rows of each job, so the job filter is a slice instead of a scan
+@st.cache_resource
+def get_job_index() -> CategoryIndex:
+    return CategoryIndex(get_data(), "job")
 
 df = get_data()
+jobs = get_job_index()
+
+AGE_BINS = 20
+
+
+# Aggregates of one job's rows, computed once per job. A tick only rescales age and balance by a
+# random factor, so mean(k * x) is k * mean(x) and the bins of k * age are the age bins with
+# their edges scaled by k: the KPIs and charts cost O(bins) per tick instead of O(rows).
+@st.cache_resource
+def job_aggregates(job):
+    rows = get_job_index().frame(job)
+    edges = np.histogram_bin_edges(rows["age"], bins=AGE_BINS)
+    aggregates = {
+        "age": Mean("age"),
+        "balance": Mean("balance"),
+        "marital": Count("marital"),
+        "age_bins": Bins("age", edges),
+        "marital_age": Bins2D("marital", "age", y_edges=edges),
+    }
+    for aggregate in aggregates.values():
+        aggregate.add(rows)
+    return aggregates
 
 # dashboard title
 st.title("Real-Time / Live Data Science Dashboard")
 
 # top-level filters
-job_filter = st.selectbox("Select the Job", pd.unique(df["job"]))
+job_filter = st.selectbox("Select the Job", jobs.values())
 
 # creating a single-element container
 placeholder = st.empty()
 
 # dataframe filter
-df = df[df["job"] == job_filter]
+df = jobs.frame(job_filter).copy()
+aggregates = job_aggregates(job_filter)
+age_centers = aggregates["age_bins"].centers()
 
 # near real-time / live feed simulation
 for seconds in range(200):
 
-    df["age_new"] = df["age"] * np.random.choice(range(1, 5))
-    df["balance_new"] = df["balance"] * np.random.choice(range(1, 5))
+    age_scale = np.random.choice(range(1, 5))
+    balance_scale = np.random.choice(range(1, 5))
+    df["age_new"] = df["age"] * age_scale
+    df["balance_new"] = df["balance"] * balance_scale
 
     # creating KPIs
-    avg_age = np.mean(df["age_new"])
+    avg_age = age_scale * aggregates["age"].value()
 
     count_married = int(
-        df[(df["marital"] == "married")]["marital"].count()
+        aggregates["marital"].value().get("married", 0)
         + np.random.choice(range(1, 30))
     )
 
-    balance = np.mean(df["balance_new"])
+    balance = balance_scale * aggregates["balance"].value()
 
     with placeholder.container():
 
@@ -77,14 +123,21 @@ for seconds in range(200):
         fig_col1, fig_col2 = st.columns(2)
         with fig_col1:
             st.markdown("### First Chart")
-            fig = px.density_heatmap(
-                data_frame=df, y="age_new", x="marital"
+            cells = aggregates["marital_age"].value()
+            fig = go.Figure(
+                go.Heatmap(x=cells.columns, y=age_centers[cells.index] * age_scale, z=cells.to_numpy()),
+                layout={"xaxis_title": "marital", "yaxis_title": "age_new"},
             )
             st.write(fig)
             
         with fig_col2:
             st.markdown("### Second Chart")
-            fig2 = px.histogram(data_frame=df, x="age_new")
+            fig2 = px.bar(
+                x=age_centers * age_scale,
+                y=aggregates["age_bins"].counts,
+                labels={"x": "age_new", "y": "count"},
+            )
+            fig2.update_layout(bargap=0)
             st.write(fig2)
 
         st.markdown("### Detailed Data View")
@@ -1,8 +1,12 @@
-import time
-import pandas as pd
+import os
 import plotly.express as px
+import plotly.graph_objects as go
 import streamlit as st
-from test_data import generate_plane_movements
+from aggregates import Count
+from live_feed import SnapshotFeed
+from motion import load_airports
+from spatial_index import GridIndex, viewport
+from test_data import TITLES, PlaneFeed
 
 st.set_page_config(
     page_title="Real-Time Plane Movements Dashboard",
@@ -10,14 +14,52 @@ st.set_page_config(
     layout="wide",
 )
 
-df = generate_plane_movements(None)
+UPDATE_INTERVAL = 1  # seconds
+SIMULATED_SECONDS_PER_TICK = 60
 
+# Set URSINE_FLEET_SIZE to load-test with a large synthetic fleet instead of the ten NATO titles
+FLEET_SIZE = int(os.environ.get('URSINE_FLEET_SIZE', 0)) or len(TITLES)
+
+
+# One feed for the whole server, created on first use: every session reads the same snapshots
+# and the feed advances at most once per UPDATE_INTERVAL, however many viewers there are
+@st.cache_resource
+def shared_feed():
+    return SnapshotFeed(PlaneFeed(FLEET_SIZE, airports=load_airports('schedule.csv'), dt=SIMULATED_SECONDS_PER_TICK),
+                        period=UPDATE_INTERVAL, key='title')
+
+
+# Plane type distribution, updated from each tick's diff rather than recounted over every row
+@st.cache_resource
+def plane_type_counts():
+    counts = Count('plane_type')
+    shared_feed().subscribe(lambda snapshot: counts.apply(snapshot.diff),
+                            start=lambda snapshot: counts.add(snapshot.frame))
+    return counts
+
+
+# Figures for one feed version, built by whichever session asks first and shared with the rest
+@st.cache_resource(max_entries=4)
+def version_figures(version):
+    df = shared_feed().snapshot(version).frame
+
+    # st.plotly_chart reports no pan/zoom, so the whole world is the view: above
+    # spatial_index.MAX_POINTS aircraft the map gets clusters instead of every point
+    points, clusters = viewport(df, GridIndex(df['lat'], df['lon']))
+    fig = px.scatter_geo(points, lat='lat', lon='lon', hover_name='title',
+                         hover_data=['plane_type', 'heading', 'speed'])
+    fig.add_trace(go.Scattergeo(lat=clusters['lat'], lon=clusters['lon'], mode='markers',
+                                marker={'size': 6 + 4 * clusters['count'] ** 0.25},
+                                text=clusters['count'].astype(int).astype(str) + ' aircraft',
+                                hoverinfo='text', showlegend=False))
+    fig.update_layout({"uirevision": "foo"}, overwrite=True)
+    fig.update_layout(height=600)
+
+    counts = plane_type_counts().value()
+    fig2 = px.bar(x=counts.index, y=counts.to_numpy(), labels={'x': 'plane_type', 'y': 'count'})
+    fig2.update_layout(height=600)
+    return fig, fig2
 
-# Function to generate data
-def get_data() -> pd.DataFrame:
-    global df
-    df = generate_plane_movements(df)
-    return df
 
 # Initialize session state for the filter if it doesn't exist
 if 'plane_type_filter' not in st.session_state:
@@ -26,9 +68,6 @@ if 'plane_type_filter' not in st.session_state:
 # Dashboard title
 st.title("Real-Time / Live Plane Movements Dashboard")
 
-# Get the data
-df = get_data()
-
 # # Add an option to select all plane types
 # all_types = ["All"] + sorted(list(pd.unique(df["plane_type"])))
 
@@ -39,41 +78,35 @@ df = get_data()
 # if selected_type != st.session_state['plane_type_filter']:
 #     st.session_state['plane_type_filter'] = selected_type
 
-# Creating a single-element container
-placeholder = st.empty()
-
-# Near real-time / live feed simulation
-for seconds in range(200):
-    # Simulate data updates (if applicable)
-    df = get_data()
+# Near real-time / live feed: only this fragment reruns on the timer, not the whole script,
+# and a rerun costs a feed tick (shared, at most once per interval) plus sending the page
+@st.fragment(run_every=UPDATE_INTERVAL)
+def live_view():
+    snapshot = shared_feed().tick()
+    df = snapshot.frame
 
     # # Apply the filter only if a specific plane type is selected
     # if st.session_state['plane_type_filter'] != "All":
     #     df = df[df["plane_type"] == st.session_state['plane_type_filter']]
 
-    with placeholder.container():
-        
-        # Create three columns for charts
-        fig_col1, fig_col2 = st.columns(2)
-
-        with fig_col1:
-
-            st.markdown("### Flight Map")
-            fig = px.scatter_geo(df, lat='lat', lon='lon', hover_name='title')
-            fig.update_layout({"uirevision": "foo"}, overwrite=True)
-            # st.write(fig)
-            fig.update_layout(height=600)
-            st.plotly_chart(fig, use_container_width=True)
-        with fig_col2:
-            st.markdown("### Plane Type Distribution")
-            fig2 = px.histogram(data_frame=df, x="plane_type")
-            fig.update_layout(height=600)
-            st.plotly_chart(fig2, use_container_width=True)
-        # with fig_col3:
-        #     st.markdown("### Streamlit Map")
-        #     st.map(df[['lat', 'lon']])
-
-        st.markdown("### Detailed Data View")
-        st.dataframe(df, use_container_width=True)
-
-        time.sleep(1)
+    fig, fig2 = version_figures(snapshot.version)
+
+    # Create three columns for charts
+    fig_col1, fig_col2 = st.columns(2)
+
+    with fig_col1:
+        st.markdown("### Flight Map")
+        # st.write(fig)
+        st.plotly_chart(fig, use_container_width=True)
+    with fig_col2:
+        st.markdown("### Plane Type Distribution")
+        st.plotly_chart(fig2, use_container_width=True)
+    # with fig_col3:
+    #     st.markdown("### Streamlit Map")
+    #     st.map(df[['lat', 'lon']])
+
+    st.markdown("### Detailed Data View")
+    st.dataframe(df, use_container_width=True)
+
+
+live_view()
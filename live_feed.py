@@ -0,0 +1,59 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import pandas as pd
+
+from snapshot_diff import diff_snapshots
+
+# One shared producer for a live feed. The feed advances at most once per `period` seconds of
+# wall time, however many callbacks or sessions ask for it, and keeps the last few versions so
+# every consumer of a given tick reads the same snapshot.
+
+# created is the wall-clock time (time.time()) the snapshot was generated
+Snapshot = namedtuple('Snapshot', ['version', 'frame', 'diff', 'created'])
+
+
+class SnapshotFeed:
+    def __init__(self, generate, period, key='title', history=4, clock=time.monotonic):
+        self.generate = generate
+        self.period = period
+        self.key = key
+        self.history = history
+        self.clock = clock
+        self.listeners = []
+        self._lock = threading.Lock()
+        self._epoch = clock()
+
+        frame = generate(None)
+        self.latest = Snapshot(0, frame, diff_snapshots(pd.DataFrame(), frame, key), time.time())
+        self._versions = OrderedDict([(0, self.latest)])
+
+    # Call listener(snapshot) once for every new version, e.g. to update a tracking store.
+    # start(snapshot), if given, is first called with the latest snapshot so that consumers which
+    # build state from diffs can begin from a full frame without missing or repeating a version.
+    def subscribe(self, listener, start=None):
+        with self._lock:
+            if start is not None:
+                start(self.latest)
+            self.listeners.append(listener)
+
+    # Advance the feed if a period has elapsed since the last version; returns the latest snapshot
+    def tick(self):
+        version = int((self.clock() - self._epoch) // self.period)
+        with self._lock:
+            if version > self.latest.version:
+                frame = self.generate(self.latest.frame)
+                diff = diff_snapshots(self.latest.frame, frame, self.key)
+                self.latest = Snapshot(version, frame, diff, time.time())
+                self._versions[version] = self.latest
+                while len(self._versions) > self.history:
+                    self._versions.popitem(last=False)
+                for listener in self.listeners:
+                    listener(self.latest)
+            return self.latest
+
+    # The snapshot published as `version`, or the latest one if that version is gone or unknown
+    def snapshot(self, version=None):
+        with self._lock:
+            return self._versions.get(version, self.latest)
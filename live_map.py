@@ -0,0 +1,46 @@
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+
+from spatial_index import corner_bounds
+
+# Figure for URSINEEVOKER.py's live map: the individual aircraft in view as the first trace
+# (the one the browser animates between ticks) and server-side clusters as a second trace.
+
+
+# Viewport bounds from a dcc.Graph's relayoutData, or None if the event carries no view extent
+def viewport_bounds(relayout_data):
+    derived = (relayout_data or {}).get('mapbox._derived')
+    if not derived or not derived.get('coordinates'):
+        return None
+    return corner_bounds(derived['coordinates'])
+
+
+def live_map_figure(points, clusters):
+    fig = px.scatter_mapbox(
+        points,
+        lat="lat",
+        lon="lon",
+        hover_name="title",
+        hover_data=["plane_type", "timestamp", "heading", "speed"],
+        color_discrete_sequence=["fuchsia"],
+        height=400)
+
+    # marker area grows with the log of the cluster size so dense cells don't cover the map
+    fig.add_trace(go.Scattermapbox(
+        lat=clusters['lat'],
+        lon=clusters['lon'],
+        mode='markers+text',
+        marker={'size': 10 + 6 * np.log10(clusters['count'].to_numpy(dtype=float).clip(1)),
+                'color': 'purple', 'opacity': 0.6},
+        text=clusters['count'].astype(int).astype(str),
+        textfont={'color': 'white'},
+        hovertemplate='%{text} aircraft<extra></extra>',
+        name='clusters',
+        showlegend=False))
+
+    fig.update_layout(mapbox_style="open-street-map",
+                      mapbox_zoom=1,
+                      mapbox_center={"lat": 20, "lon": 0},  # Example center coordinates
+                      uirevision='constant')
+    return fig
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+from airports import build_airport_index
+from schedule_loader import SCHEDULE_PATH, decimal_floats, read_schedule
+
+# Great-circle motion for the plane feed. Every function works on whole arrays of aircraft at
+# once; angles are in degrees, distances in km, speeds in km/h and headings clockwise from north.
+
+EARTH_RADIUS_KM = 6371.0
+
+# Typical cruise speeds per plane_type
+CRUISE_SPEED_KMH = {
+    "A320": 830.0,
+    "B737": 840.0,
+    "A380": 900.0,
+    "B747": 910.0,
+    "Cessna": 230.0,
+    "Embraer": 800.0,
+    "Bombardier": 780.0,
+}
+DEFAULT_SPEED_KMH = 800.0
+
+
+def cruise_speeds(plane_types):
+    return pd.Series(plane_types).map(CRUISE_SPEED_KMH).fillna(DEFAULT_SPEED_KMH).to_numpy(dtype=float)
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def initial_bearing(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    y = np.sin(lon2 - lon1) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(lon2 - lon1)
+    return np.degrees(np.arctan2(y, x)) % 360.0
+
+
+# Point reached after travelling `distance` km from (lat, lon) on the initial `bearing`
+def destination_point(lat, lon, bearing, distance):
+    lat, lon, bearing = map(np.radians, (lat, lon, bearing))
+    delta = np.asarray(distance, dtype=float) / EARTH_RADIUS_KM
+    new_lat = np.arcsin(np.sin(lat) * np.cos(delta) + np.cos(lat) * np.sin(delta) * np.cos(bearing))
+    new_lon = lon + np.arctan2(np.sin(bearing) * np.sin(delta) * np.cos(lat),
+                               np.cos(delta) - np.sin(lat) * np.sin(new_lat))
+    return np.degrees(new_lat), (np.degrees(new_lon) + 540.0) % 360.0 - 180.0
+
+
+# Move every aircraft `dt` seconds towards its destination along the great circle, stopping at
+# the destination. Returns new lat, lon, heading and a mask of the aircraft that arrived.
+def advance(lat, lon, dst_lat, dst_lon, speed_kmh, dt):
+    remaining = distance_km(lat, lon, dst_lat, dst_lon)
+    heading = initial_bearing(lat, lon, dst_lat, dst_lon)
+    step = np.asarray(speed_kmh, dtype=float) * np.asarray(dt, dtype=float) / 3600.0
+    arrived = step >= remaining
+
+    new_lat, new_lon = destination_point(lat, lon, heading, np.minimum(step, remaining))
+    new_lat = np.where(arrived, dst_lat, new_lat)
+    new_lon = np.where(arrived, dst_lon, new_lon)
+    return new_lat, new_lon, heading, arrived
+
+
+# Unique airport coordinates from a schedule file, used as route endpoints. The file goes through
+# the shared schedule reader (validated columns and aliases, typed coordinates).
+def load_airports(path=SCHEDULE_PATH):
+    airports = build_airport_index(read_schedule(path)).index
+    points = pd.DataFrame({
+        'lat': decimal_floats(airports.get_level_values('lat')),
+        'lon': decimal_floats(airports.get_level_values('lng')),
+    }).drop_duplicates()
+    return points['lat'].to_numpy(dtype=float), points['lon'].to_numpy(dtype=float)
@@ -0,0 +1,118 @@
+import json
+import logging
+import queue
+import threading
+
+# Server-sent events for a SnapshotFeed. One background publisher advances the feed while anyone
+# is listening and hands each new version to a Broadcaster, which serialises the message once and
+# queues it for every connected client; nothing runs while nobody is connected. A client that
+# falls behind only loses stale messages, since each one supersedes the last.
+
+QUEUE_SIZE = 4
+HEARTBEAT = 15  # seconds between keep-alive comments, which also detect closed connections
+
+log = logging.getLogger(__name__)
+
+
+def sse_message(data, event=None, id=None):
+    lines = []
+    if event is not None:
+        lines.append(f"event: {event}")
+    if id is not None:
+        lines.append(f"id: {id}")
+    lines.extend(f"data: {line}" for line in json.dumps(data, separators=(',', ':')).splitlines())
+    return '\n'.join(lines) + '\n\n'
+
+
+class Broadcaster:
+    def __init__(self, queue_size=QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.clients = set()
+        self.last = None  # sent first to new clients so they start from the current version
+        self.sent = 0
+        self._lock = threading.Condition()
+
+    def __len__(self):
+        with self._lock:
+            return len(self.clients)
+
+    def publish(self, message):
+        with self._lock:
+            self.last = message
+            for client in self.clients:
+                try:
+                    client.put_nowait(message)
+                except queue.Full:
+                    client.get_nowait()  # drop the oldest, the client only needs the latest
+                    client.put_nowait(message)
+            self.sent += len(self.clients)
+
+    def subscribe(self):
+        client = queue.Queue(self.queue_size)
+        with self._lock:
+            if self.last is not None:
+                client.put_nowait(self.last)
+            self.clients.add(client)
+            self._lock.notify_all()
+        return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self.clients.discard(client)
+
+    # Block until at least one client is connected
+    def wait_for_clients(self):
+        with self._lock:
+            self._lock.wait_for(lambda: self.clients)
+
+    # Response body for one client: queued messages as they come, with heartbeats in between
+    def stream(self):
+        client = self.subscribe()
+        try:
+            while True:
+                try:
+                    yield client.get(timeout=HEARTBEAT)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+        finally:
+            self.unsubscribe(client)
+
+
+# Message for a new snapshot: its version plus the size of its diff
+def snapshot_message(snapshot):
+    diff = snapshot.diff
+    return sse_message({
+        'version': snapshot.version,
+        'added': len(diff.added),
+        'removed': len(diff.removed),
+        'changed': len(diff.changed),
+    }, event='snapshot', id=snapshot.version)
+
+
+# Single producer: tick the feed while clients are connected and publish each new version. It
+# checks a few times per `period` so a version goes out soon after it is due; in between, tick()
+# is only a clock comparison. An error in the feed or one of its listeners is logged and retried on
+# the next check rather than ending the thread, which would stall every page.
+class FeedPublisher(threading.Thread):
+    def __init__(self, feed, broadcaster, period):
+        super().__init__(name='feed-publisher', daemon=True)
+        self.feed = feed
+        self.broadcaster = broadcaster
+        self.period = period
+        self.stopped = threading.Event()
+
+    def run(self):
+        published = None
+        while not self.stopped.is_set():
+            self.broadcaster.wait_for_clients()
+            try:
+                snapshot = self.feed.tick()
+                if snapshot.version != published:
+                    self.broadcaster.publish(snapshot_message(snapshot))
+                    published = snapshot.version
+            except Exception:
+                log.exception("feed publisher: tick failed, retrying")
+            self.stopped.wait(self.period / 4)
+
+    def stop(self):
+        self.stopped.set()
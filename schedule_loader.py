@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+from datasets import load_cached
+from interval_index import TimeIntervals
+
+# One typed reader for schedule.csv-style files, shared by every entry point. Columns are
+# validated and renamed to the names the rest of the code uses (the file's own spelling, which
+# mixes src_lng and dst_long), coordinates are float32, airport names and cargo categoricals,
+# counts int32 and dates datetime64. load_schedule() can keep a Feather copy for instant reloads,
+# and schedule_intervals() indexes the legs by time.
+
+SCHEDULE_PATH = './schedule.csv'
+
+SCHEDULE_DTYPES = {
+    'src_lat': 'float32',
+    'src_lng': 'float32',
+    'dst_lat': 'float32',
+    'dst_long': 'float32',
+    'src_name': 'category',
+    'dest_name': 'category',
+    'weight': 'int32',
+    'passengers': 'int32',
+    'flight_num': 'str',
+    'cargo_description': 'category',
+}
+DATE_COLUMNS = ['departure_date', 'arrival_date']
+SCHEDULE_COLUMNS = list(SCHEDULE_DTYPES) + DATE_COLUMNS
+
+# Other spellings accepted for the canonical column names
+COLUMN_ALIASES = {
+    'src_long': 'src_lng', 'src_lon': 'src_lng',
+    'dst_lng': 'dst_long', 'dst_lon': 'dst_long',
+    'dest_lat': 'dst_lat', 'dest_lng': 'dst_long', 'dest_long': 'dst_long',
+    'dst_name': 'dest_name',
+}
+
+
+# Rename aliased columns and check that every schedule column is there
+def normalize_columns(df):
+    df = df.rename(columns={c: COLUMN_ALIASES[c] for c in df.columns
+                            if c in COLUMN_ALIASES and COLUMN_ALIASES[c] not in df.columns})
+    missing = [c for c in SCHEDULE_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"schedule is missing columns: {', '.join(missing)}")
+    return df
+
+
+# Validated frame with the schedule dtypes; extra columns are kept as they are
+def typed_schedule(df):
+    df = normalize_columns(df)
+    df = df.astype({c: t for c, t in SCHEDULE_DTYPES.items() if df[c].dtype != t})
+    for column in DATE_COLUMNS:
+        # exports and uploads mix 'YYYY-MM-DD HH:MM:SS' with 'T' separators and fractional seconds
+        df[column] = pd.to_datetime(df[column], format='ISO8601')
+    return df
+
+
+def read_csv_dtypes():
+    dtypes = dict(SCHEDULE_DTYPES)
+    dtypes.update({alias: SCHEDULE_DTYPES[name] for alias, name in COLUMN_ALIASES.items()})
+    return dtypes
+
+
+# Read a schedule from a path or buffer, with the dtypes applied while parsing
+def read_schedule(source, **read_csv_kwargs):
+    return typed_schedule(pd.read_csv(source, dtype=read_csv_dtypes(), **read_csv_kwargs))
+
+
+# The same, one chunk of rows at a time
+def read_schedule_chunks(source, chunk_size):
+    for chunk in pd.read_csv(source, dtype=read_csv_dtypes(), chunksize=chunk_size):
+        yield typed_schedule(chunk)
+
+
+# Read schedule.csv, through a Feather cache at `cache_path` when one is given; the cache is
+# rebuilt whenever the CSV is newer
+def load_schedule(path=SCHEDULE_PATH, cache_path=None):
+    if cache_path is None:
+        return read_schedule(path)
+    return load_cached(path, cache_path, prepare=typed_schedule, dtype=read_csv_dtypes())
+
+
+# Interval index over the legs' departure -> arrival times, for "airborne at" / range queries
+def schedule_intervals(df):
+    return TimeIntervals(df['departure_date'], df['arrival_date'])
+
+
+# float32 values as the float64 nearest their shortest decimal form (34.0522 rather than
+# 34.05220031738281), for output that prints Python floats such as folium maps or JSON
+def decimal_floats(values):
+    values = np.asarray(values)
+    if values.dtype != np.float32:
+        return values
+    return values.astype(str).astype(np.float64)
+
+
+def decimal_frame(df):
+    df = df.copy()
+    for column in df.columns[(df.dtypes == np.float32).to_numpy()]:
+        df[column] = decimal_floats(df[column])
+    return df
@@ -0,0 +1,265 @@
+import threading
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Keyed diff between two snapshots of the live feed, plus a columnar store of tracking sessions
+# (entry/exit/update count per continuous appearance of a title) that consumes those diffs.
+# Closed sessions past the store's retention (count and/or age) are compacted into one summary
+# row per title, so memory is bounded by the retention rather than by uptime.
+
+# added/removed/changed/unchanged are frames with the key as a column; changed_previous holds
+# the previous values of the changed rows, in the same order as `changed`
+SnapshotDiff = namedtuple('SnapshotDiff', ['key', 'added', 'removed', 'changed', 'unchanged', 'changed_previous'])
+
+
+OCCURRENCE = '_occurrence'
+
+
+def keyed(df, key, occurrence=False):
+    if key not in df.columns:
+        index = pd.MultiIndex.from_arrays([[], []], names=[key, OCCURRENCE]) if occurrence else pd.Index([], name=key)
+        return pd.DataFrame(index=index)
+    if not occurrence:
+        return df.set_index(key)
+    return df.set_index([key, df.groupby(key, sort=False, observed=True, dropna=False).cumcount().rename(OCCURRENCE)])
+
+
+# Both snapshots indexed by `key`. A key can repeat (a flight number on several dates), so when
+# either side has duplicates the n-th row with a key is matched to the n-th row with it on the
+# other side, through a (key, occurrence) index.
+def keyed_pair(previous, current, key):
+    occurrence = any(key in df.columns and not df[key].is_unique for df in (previous, current))
+    return keyed(previous, key, occurrence), keyed(current, key, occurrence)
+
+
+def unkeyed(df):
+    return df.reset_index().drop(columns=OCCURRENCE, errors='ignore')
+
+
+# Position of each current row in the previous snapshot (-1 for new keys), which previous rows
+# were matched, and which current rows differ from their previous values in `columns`
+def match_snapshots(prev, cur, columns):
+    positions = prev.index.get_indexer(cur.index)
+    matched = positions >= 0
+    seen = np.zeros(len(prev), dtype=bool)
+    seen[positions[matched]] = True
+
+    a = cur.iloc[matched][columns].reset_index(drop=True)
+    b = prev.iloc[positions[matched]][columns].reset_index(drop=True)
+    # categoricals only compare when their categories match, e.g. not across two CSV reads
+    for column in columns:
+        if a[column].dtype != b[column].dtype and isinstance(a[column].dtype, pd.CategoricalDtype):
+            a[column] = a[column].astype(a[column].cat.categories.dtype)
+        if a[column].dtype != b[column].dtype and isinstance(b[column].dtype, pd.CategoricalDtype):
+            b[column] = b[column].astype(b[column].cat.categories.dtype)
+    differs = np.zeros(len(cur), dtype=bool)
+    differs[matched] = ((a != b) & ~(a.isna() & b.isna())).any(axis=1).to_numpy()
+    return positions, matched, seen, differs
+
+
+def shared_columns(prev, cur, columns):
+    if columns is None:
+        return [c for c in cur.columns if c in prev.columns]
+    return columns
+
+
+# Compare `current` against `previous` on `key` in one indexed pass. `columns` limits which
+# columns count towards "changed"; by default every column the two snapshots share.
+def diff_snapshots(previous, current, key='title', columns=None):
+    prev, cur = keyed_pair(previous, current, key)
+    columns = shared_columns(prev, cur, columns)
+
+    # one hash lookup of every current key in the previous snapshot drives the whole diff
+    positions, matched, seen, differs = match_snapshots(prev, cur, columns)
+    return SnapshotDiff(
+        key=key,
+        added=unkeyed(cur.iloc[~matched]),
+        removed=unkeyed(prev.iloc[~seen]),
+        changed=unkeyed(cur.iloc[differs]),
+        unchanged=unkeyed(cur.iloc[matched & ~differs]),
+        changed_previous=unkeyed(prev.iloc[positions[differs]][columns]),
+    )
+
+
+# Current rows in their own order with a status column ('added', 'modified' or 'unchanged'),
+# followed by the rows that were removed (status 'removed')
+def status_frame(previous, current, key='title', columns=None):
+    prev, cur = keyed_pair(previous, current, key)
+    positions, matched, seen, differs = match_snapshots(prev, cur, shared_columns(prev, cur, columns))
+
+    status = np.where(~matched, 'added', np.where(differs, 'modified', 'unchanged'))
+    frame = current.assign(status=status).reset_index(drop=True)
+    if seen.all():
+        return frame
+    return pd.concat([frame, previous.iloc[np.flatnonzero(~seen)].assign(status='removed')], ignore_index=True)
+
+
+# Current rows labelled 'addition' or 'existing', plus the removed rows labelled 'removal'
+def label_snapshot(diff):
+    return pd.concat([
+        diff.added.assign(status='addition'),
+        diff.changed.assign(status='existing'),
+        diff.unchanged.assign(status='existing'),
+        diff.removed.assign(status='removal'),
+    ], ignore_index=True)
+
+
+SUMMARY_COLUMNS = ['sessions', 'updates', 'first_entry', 'last_exit']
+
+
+class TrackingStore:
+    def __init__(self, capacity=1024, max_sessions=None, max_age=None):
+        self.size = 0
+        self.titles = np.empty(capacity, dtype=object)
+        self.entries = np.empty(capacity, dtype='datetime64[us]')
+        self.exits = np.full(capacity, np.datetime64('NaT'), dtype='datetime64[us]')
+        self.updates = np.zeros(capacity, dtype=np.int64)
+        # title -> row of its open session
+        self.current = pd.Series(dtype=np.int64)
+
+        # retention for closed sessions; open sessions are always kept
+        self.max_sessions = max_sessions
+        self.max_age = None if max_age is None else np.timedelta64(max_age, 'us')
+        self.closed = 0
+        self.last_compaction = None
+        self.summaries = pd.DataFrame(columns=SUMMARY_COLUMNS, index=pd.Index([], name='title'))
+        # the feed's listener updates (and compacts) while sessions read pages from other threads
+        self._lock = threading.Lock()
+
+    def _grow(self, needed):
+        capacity = len(self.titles)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        extra = capacity - len(self.titles)
+        self.titles = np.concatenate([self.titles, np.empty(extra, dtype=object)])
+        self.entries = np.concatenate([self.entries, np.empty(extra, dtype='datetime64[us]')])
+        self.exits = np.concatenate([self.exits, np.full(extra, np.datetime64('NaT'), dtype='datetime64[us]')])
+        self.updates = np.concatenate([self.updates, np.zeros(extra, dtype=np.int64)])
+
+    # Apply one snapshot diff observed at `now`: count an update for every tracked title still
+    # present, close the sessions of removed ones and open sessions for new (or untracked) titles
+    def update(self, diff, now):
+        with self._lock:
+            self._update(diff, now)
+
+    def _update(self, diff, now):
+        now = np.datetime64(now, 'us')
+        key = diff.key
+        open_rows = self.current.to_numpy()
+
+        present = pd.Index(pd.concat([diff.changed[key], diff.unchanged[key]]))
+        positions = self.current.index.get_indexer(present)
+        self.updates[open_rows[positions[positions >= 0]]] += 1
+
+        removed = pd.Index(diff.removed[key])
+        closed = self.current.index.get_indexer(removed)
+        self.exits[open_rows[closed[closed >= 0]]] = now
+
+        added = pd.Index(diff.added[key]).append(present[positions < 0]).to_numpy()
+        rows = np.arange(self.size, self.size + len(added))
+        self._grow(self.size + len(added))
+        self.titles[rows] = added
+        self.entries[rows] = now
+        self.updates[rows] = 1
+        self.size += len(added)
+
+        still_open = np.ones(len(open_rows), dtype=bool)
+        still_open[closed[closed >= 0]] = False
+        self.current = pd.concat([self.current[still_open], pd.Series(rows, index=added)])
+        self.closed += int((closed >= 0).sum())
+
+        if self._compaction_due(now):
+            self._compact(now)
+
+    # Compaction rewrites the arrays, so it only runs once the retention is overshot by a margin
+    def _compaction_due(self, now):
+        if self.last_compaction is None:
+            self.last_compaction = now
+        if self.max_sessions is not None and self.closed > self.max_sessions * 1.25 + 16:
+            return True
+        if self.max_age is not None and now - self.last_compaction >= self.max_age / 4:
+            return True
+        return False
+
+    # Fold closed sessions outside the retention into per-title summaries and drop them
+    def compact(self, now):
+        with self._lock:
+            self._compact(now)
+
+    def _compact(self, now):
+        now = np.datetime64(now, 'us')
+        self.last_compaction = now
+        exits = self.exits[:self.size]
+        is_closed = ~np.isnat(exits)
+
+        expired = np.zeros(self.size, dtype=bool)
+        if self.max_age is not None:
+            expired |= is_closed & (exits < now - self.max_age)
+        if self.max_sessions is not None:
+            closed_rows = np.flatnonzero(is_closed & ~expired)
+            expired[closed_rows[:max(0, len(closed_rows) - self.max_sessions)]] = True
+        if not expired.any():
+            return
+
+        folded = pd.DataFrame({
+            'title': self.titles[:self.size][expired],
+            'sessions': 1,
+            'updates': self.updates[:self.size][expired],
+            'first_entry': self.entries[:self.size][expired],
+            'last_exit': exits[expired],
+        }).groupby('title').agg({'sessions': 'sum', 'updates': 'sum', 'first_entry': 'min', 'last_exit': 'max'})
+        if self.summaries.empty:
+            self.summaries = folded
+        else:
+            self.summaries = pd.concat([self.summaries, folded]).groupby(level=0).agg(
+                {'sessions': 'sum', 'updates': 'sum', 'first_entry': 'min', 'last_exit': 'max'})
+
+        keep = np.flatnonzero(~expired)
+        for name in ('titles', 'entries', 'exits', 'updates'):
+            column = getattr(self, name)
+            column[:len(keep)] = column[keep]
+        self.exits[len(keep):self.size] = np.datetime64('NaT')
+        self.titles[len(keep):self.size] = None
+        self.closed -= int(expired.sum())
+
+        # open sessions moved down with everything else
+        new_rows = np.full(self.size, -1, dtype=np.int64)
+        new_rows[keep] = np.arange(len(keep))
+        self.current = pd.Series(new_rows[self.current.to_numpy()], index=self.current.index)
+        self.size = len(keep)
+
+    def records(self, rows=None):
+        with self._lock:
+            return self._records(rows)
+
+    def _records(self, rows=None):
+        if rows is None:
+            rows = np.arange(self.size)
+        titles = pd.Series(self.titles[rows], dtype=object)
+        entries = pd.Series(self.entries[rows])
+        return pd.DataFrame({
+            'flight_id': titles + '_' + entries.astype(str).astype(object),
+            'title': titles,
+            'entry': entries,
+            'exit': self.exits[rows],
+            'updates': self.updates[rows],
+        })
+
+    def page_count(self, page_size):
+        with self._lock:
+            return max(1, -(-self.size // page_size))
+
+    # One page of sessions, newest first; costs O(page_size) whatever the history length
+    def page(self, page_current, page_size):
+        with self._lock:
+            stop = self.size - page_current * page_size
+            start = max(0, stop - page_size)
+            return self._records(np.arange(stop - 1, start - 1, -1) if stop > 0 else np.arange(0))
+
+    def summary(self):
+        with self._lock:
+            return self.summaries.reset_index()
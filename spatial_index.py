@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+
+# Uniform lat/lon grid over the positions of one snapshot, for viewport culling and server-side
+# clustering on the live maps. Points are sorted by cell once; a viewport query is then one
+# binary search per grid row it covers plus an exact bounds check on the edge cells.
+# Bounds are (south, north, west, east) in degrees; west > east means the box crosses 180°.
+
+WORLD = (-90.0, 90.0, -180.0, 180.0)
+CELL_DEGREES = 1.0
+MAX_POINTS = 2_000  # more points than this in view are clustered
+CLUSTER_COLUMNS = 48  # clusters across the width of the view
+
+
+def wrap(lon):
+    return (np.asarray(lon, dtype=float) + 180.0) % 360.0 - 180.0
+
+
+def width(bounds):
+    south, north, west, east = bounds
+    return (east - west) % 360.0 or 360.0
+
+
+def contains(bounds, lat, lon):
+    south, north, west, east = bounds
+    inside = (lat >= south) & (lat <= north)
+    if width(bounds) >= 360.0:
+        return inside
+    if west <= east:
+        return inside & (lon >= west) & (lon <= east)
+    return inside & ((lon >= west) | (lon <= east))
+
+
+# Bounds of a map view from its corner coordinates as [lon, lat] pairs, e.g. the
+# relayoutData['mapbox._derived']['coordinates'] plotly reports on pan and zoom (NW, NE, SE, SW)
+def corner_bounds(coordinates):
+    lons = [c[0] for c in coordinates]
+    lats = [c[1] for c in coordinates]
+    south, north = max(-90.0, min(lats)), min(90.0, max(lats))
+    if max(lons) - min(lons) >= 360.0:
+        return south, north, -180.0, 180.0
+    west = float(wrap(min(lons)))
+    east = west + max(lons) - min(lons)
+    return south, north, west, east - 360.0 if east > 180.0 else east
+
+
+class GridIndex:
+    def __init__(self, lat, lon, cell_degrees=CELL_DEGREES):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = wrap(lon)
+        self.cell_degrees = cell_degrees
+        self.rows = int(np.ceil(180.0 / cell_degrees))
+        self.columns = int(np.ceil(360.0 / cell_degrees))
+
+        cells = self.row(self.lat) * self.columns + self.column(self.lon)
+        self.order = np.argsort(cells, kind='stable')
+        self.cells = cells[self.order]
+
+    def __len__(self):
+        return len(self.lat)
+
+    def row(self, lat):
+        return np.clip((np.asarray(lat) + 90.0) // self.cell_degrees, 0, self.rows - 1).astype(np.int64)
+
+    def column(self, lon):
+        return np.clip((np.asarray(lon) + 180.0) // self.cell_degrees, 0, self.columns - 1).astype(np.int64)
+
+    # Positions of the points inside `bounds`, in ascending order
+    def query(self, bounds=WORLD):
+        south, north, west, east = bounds
+        if south <= -90.0 and north >= 90.0 and width(bounds) >= 360.0:
+            return np.arange(len(self))
+
+        if width(bounds) >= 360.0:
+            spans = [(0, self.columns - 1)]
+        elif west <= east:
+            spans = [(self.column(west), self.column(east))]
+        else:
+            spans = [(self.column(west), self.columns - 1), (0, self.column(east))]
+
+        rows = np.arange(self.row(south), self.row(north) + 1) * self.columns
+        starts = np.concatenate([rows + first for first, _ in spans])
+        stops = np.concatenate([rows + last + 1 for _, last in spans])
+        lo = np.searchsorted(self.cells, starts)
+        hi = np.searchsorted(self.cells, stops)
+        candidates = np.concatenate([self.order[a:b] for a, b in zip(lo, hi) if b > a] or [np.arange(0)])
+
+        candidates = candidates[contains(bounds, self.lat[candidates], self.lon[candidates])]
+        return np.sort(candidates)
+
+
+# Group points into `columns` cells across the view (square cells in degrees). Returns a frame of
+# one cluster per non-empty cell (centroid lat/lon and count) and each point's cluster size.
+def cluster_points(lat, lon, bounds, columns=CLUSTER_COLUMNS):
+    south, north, west, east = bounds
+    size = width(bounds) / columns
+    x = np.clip(((lon - west) % 360.0) // size, 0, columns - 1).astype(np.int64)
+    y = np.clip((lat - south) // size, 0, None).astype(np.int64)
+    cells = y * columns + x
+
+    _, inverse, counts = np.unique(cells, return_inverse=True, return_counts=True)
+    east_of_west = (lon - west) % 360.0
+    clusters = pd.DataFrame({
+        'lat': np.bincount(inverse, weights=lat) / counts,
+        'lon': wrap(west + np.bincount(inverse, weights=east_of_west) / counts),
+        'count': counts,
+    })
+    return clusters, counts[inverse]
+
+
+# Frame rows to draw for a view: every point inside `bounds` when there are at most
+# `max_points`, otherwise clusters, with cells holding a single point still drawn as that point
+def viewport(frame, index, bounds=None, max_points=MAX_POINTS, columns=CLUSTER_COLUMNS):
+    bounds = bounds or WORLD
+    rows = index.query(bounds)
+    if len(rows) <= max_points:
+        return frame.iloc[rows], pd.DataFrame({'lat': [], 'lon': [], 'count': []})
+
+    clusters, sizes = cluster_points(index.lat[rows], index.lon[rows], bounds, columns)
+    return frame.iloc[rows[sizes == 1]], clusters[clusters['count'] > 1].reset_index(drop=True)
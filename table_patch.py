@@ -0,0 +1,118 @@
+import json
+import threading
+from collections import OrderedDict, deque
+
+import pandas as pd
+from dash import Patch
+from plotly.utils import PlotlyJSONEncoder
+
+# Delta updates for server-paged DataTables. The server remembers the page it last sent to each
+# browser session and table, and answers the next tick with a dash Patch holding only the rows
+# inserted or removed and the cells updated (rows matched by a key column), falling back to the
+# whole page when that would be smaller.
+
+MAX_SESSIONS = 256
+METRICS_WINDOW = 120
+
+
+def payload_bytes(value):
+    if isinstance(value, Patch):
+        value = value.to_plotly_json()
+    return len(json.dumps(value, cls=PlotlyJSONEncoder))
+
+
+# Sort a frame by a DataTable sort_by list ([{'column_id': ..., 'direction': 'asc'}, ...])
+def sort_frame(df, sort_by):
+    if not sort_by:
+        return df
+    return df.sort_values([s['column_id'] for s in sort_by],
+                          ascending=[s['direction'] == 'asc' for s in sort_by],
+                          kind='stable')
+
+
+# Cell equality where missing values (None, NaN, NaT) all match each other, since NaN != NaN
+def same_value(a, b):
+    return a == b or (pd.isna(a) and pd.isna(b))
+
+
+# Patch turning `old_rows` into `new_rows`, plus (inserted, updated, removed) counts. Returns
+# (None, counts) when the surviving rows changed order, in which case the page is resent whole.
+def page_patch(old_rows, new_rows, key):
+    old_keys = [row[key] for row in old_rows]
+    new_keys = [row[key] for row in new_rows]
+    old_set, new_set = set(old_keys), set(new_keys)
+
+    removed = [i for i, k in enumerate(old_keys) if k not in new_set]
+    if [k for k in old_keys if k in new_set] != [k for k in new_keys if k in old_set]:
+        return None, (len(new_set - old_set), 0, len(removed))
+
+    patch = Patch()
+    for i in reversed(removed):
+        del patch[i]
+
+    old_by_key = dict(zip(old_keys, old_rows))
+    inserted = updated = 0
+    for i, (k, row) in enumerate(zip(new_keys, new_rows)):
+        if k not in old_set:
+            patch.insert(i, row)
+            inserted += 1
+        elif row != old_by_key[k]:
+            # only the cells that changed
+            old = old_by_key[k]
+            changed = [column for column, value in row.items() if not same_value(old.get(column), value)]
+            for column in changed:
+                patch[i][column] = row[column]
+            updated += bool(changed)
+    return patch, (inserted, updated, len(removed))
+
+
+class PagedTableSessions:
+    def __init__(self, key, max_sessions=MAX_SESSIONS, window=METRICS_WINDOW):
+        self.key = key
+        self.max_sessions = max_sessions
+        self.sent = OrderedDict()  # session id -> (sequence number, rows) last sent to it
+        self.bytes_sent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    # Data for this session's table: a Patch against what it already has, or the full page when
+    # `full` is set (sort/page change), the session is unknown or the page was reordered.
+    # `applied` is the sequence number of the last response the browser applied (stats['sequence']
+    # sent back to the server, e.g. through a dcc.Store); Dash drops the responses of superseded
+    # requests, so a patch is only built when that is the page the server last sent.
+    def update(self, session_id, rows, full=False, applied=None):
+        with self._lock:
+            last = None if session_id is None else self.sent.get(session_id)
+            previous = None
+            if last is not None and not full and applied == last[0]:
+                previous = last[1]
+            sequence = last[0] + 1 if last is not None else 1
+            if session_id is not None:
+                self.sent[session_id] = (sequence, rows)
+                self.sent.move_to_end(session_id)
+                while len(self.sent) > self.max_sessions:
+                    self.sent.popitem(last=False)
+
+        data, counts = None, (len(rows), 0, 0)
+        if previous is not None:
+            data, counts = page_patch(previous, rows, self.key)
+
+        # a patch that touches most of the page can be larger than the page itself
+        full_page = payload_bytes(rows)
+        sent = full_page if data is None else payload_bytes(data)
+        if sent >= full_page:
+            data, sent = rows, full_page
+        self.bytes_sent.append(sent)
+        return data, {'sequence': sequence, 'bytes': sent, 'full_page_bytes': full_page, 'patched': data is not rows,
+                      'inserted': counts[0], 'updated': counts[1], 'removed': counts[2]}
+
+    def mean_bytes(self):
+        return sum(self.bytes_sent) / len(self.bytes_sent) if self.bytes_sent else 0
+
+
+def describe_update(name, stats, mean_bytes=None):
+    mode = 'patch' if stats['patched'] else 'full page'
+    text = (f"{name}: {stats['bytes']:,} B sent as {mode} (full page {stats['full_page_bytes']:,} B; "
+            f"{stats['inserted']} inserted, {stats['updated']} updated, {stats['removed']} removed)")
+    if mean_bytes is not None:
+        text += f", {mean_bytes:,.0f} B per update on average"
+    return text
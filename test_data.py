@@ -1,49 +1,237 @@
 import pandas as pd
 import numpy as np
-import random
-from datetime import datetime, timedelta
 
-def generate_plane_movements(previous_df=None):
-    titles = ["Alpha", "Bravo", "Charlie", "Delta", "Echo", "Foxtrot", "Golf", "Hotel", "India", "Juliet"]
-    plane_types = ["A320", "B737", "A380", "B747", "Cessna", "Embraer", "Bombardier"]
+from motion import advance, cruise_speeds, initial_bearing
+
+TITLES = ["Alpha", "Bravo", "Charlie", "Delta", "Echo", "Foxtrot", "Golf", "Hotel", "India", "Juliet"]
+PLANE_TYPES = ["A320", "B737", "A380", "B747", "Cessna", "Embraer", "Bombardier"]
+
+_rng = np.random.default_rng()
+
+
+# The ten NATO titles, then "Alpha-1" ... "Juliet-1", "Alpha-2" ... for larger fleets
+def fleet_titles(fleet_size):
+    index = np.arange(fleet_size)
+    base = np.array(TITLES, dtype=object)[index % len(TITLES)]
+    suffix = np.where(index < len(TITLES), "", "-" + (index // len(TITLES)).astype(str).astype(object))
+    return base + suffix
+
+
+def random_timestamps(rng, size):
+    return pd.Timestamp.now() - pd.to_timedelta(rng.integers(0, 121, size), unit="min")
+
+
+def wrap_longitude(lon):
+    return (lon + 540.0) % 360.0 - 180.0
+
+
+def random_planes(rng, titles):
+    size = len(titles)
+    return pd.DataFrame({
+        "title": titles,
+        "lat": rng.uniform(-90, 90, size=size),
+        "lon": rng.uniform(-180, 180, size=size),
+        "timestamp": random_timestamps(rng, size),
+        "plane_type": np.array(PLANE_TYPES, dtype=object)[rng.integers(0, len(PLANE_TYPES), size)],
+    })
+
+
+# How many of `changes` add/remove events become additions (only while unused titles remain)
+# and removals (never below one row), with a fair coin per event
+def churn_counts(rng, changes, available, active):
+    additions = min(int(rng.binomial(changes, 0.5)), available)
+    removals = min(changes - additions, active - 1)
+    return additions, max(removals, 0)
+
+
+def generate_plane_movements(previous_df=None, titles=TITLES, rng=None):
+    rng = _rng if rng is None else rng
+    titles = np.asarray(titles, dtype=object)
 
     if previous_df is None:
         # Initial DataFrame generation
-        num_rows = random.randint(10, len(titles))  # Ensure num_rows does not exceed the length of titles
-        df = pd.DataFrame({
-            "title": random.sample(titles, num_rows),
-            "lat": np.random.uniform(-90, 90, size=num_rows),
-            "lon": np.random.uniform(-180, 180, size=num_rows),
-            "timestamp": [datetime.now() - timedelta(minutes=random.randint(0, 120)) for _ in range(num_rows)],
-            "plane_type": [random.choice(plane_types) for _ in range(num_rows)]
-        })
+        num_rows = int(rng.integers(min(10, len(titles)), len(titles) + 1))  # Ensure num_rows does not exceed the length of titles
+        df = random_planes(rng, rng.choice(titles, num_rows, replace=False))
     else:
         # Modify the existing DataFrame
         df = previous_df.copy()
-        df['lat'] += np.random.uniform(-0.5, 0.5, size=len(df))
-        df['lon'] += np.random.uniform(-0.5, 0.5, size=len(df))
-        df['timestamp'] = [datetime.now() - timedelta(minutes=random.randint(0, 120)) for _ in range(len(df))]
+        df['lat'] = np.clip(df['lat'] + rng.uniform(-0.5, 0.5, size=len(df)), -90, 90)
+        df['lon'] = wrap_longitude(df['lon'] + rng.uniform(-0.5, 0.5, size=len(df)))
+        df['timestamp'] = random_timestamps(rng, len(df))
 
     # Simulate add/remove 5% of data
     changes = max(1, int(0.05 * len(df)))
-    for _ in range(changes):
-        if random.random() < 0.5 and len(set(titles) - set(df['title'])) > 0:  # Add a new row if unused titles are available
-            new_row = pd.DataFrame([{
-                "title": random.choice(list(set(titles) - set(df['title']))),
-                "lat": np.random.uniform(-90, 90),
-                "lon": np.random.uniform(-180, 180),
-                "timestamp": datetime.now() - timedelta(minutes=random.randint(0, 120)),
-                "plane_type": random.choice(plane_types)
-            }])
-            df = pd.concat([df, new_row], ignore_index=True)
-        elif len(df) > 1:  # Remove a row if more than one row exists
-            df = df.drop(df.sample().index)
+    unused = titles[~np.isin(titles, df['title'].to_numpy(dtype=object))]
+    additions, removals = churn_counts(rng, changes, len(unused), len(df))
+    if removals:
+        df = df.drop(df.index[rng.choice(len(df), removals, replace=False)])
+    if additions:
+        df = pd.concat([df, random_planes(rng, rng.choice(unused, additions, replace=False))], ignore_index=True)
 
     return df
 
-# Example usage
-current_df = generate_plane_movements()  # First run
-print(current_df)
 
-next_df = generate_plane_movements(current_df)  # Subsequent run
-print(next_df)
+# Stateful feed for load tests: a fixed pool of `fleet_size` aircraft, of which roughly
+# `active` are in the air at any time. Every step moves the active aircraft and adds/removes
+# `churn` of them, all as array operations over the pool, so a step over a million aircraft
+# stays cheap. Seed it for reproducible runs.
+#
+# Without `airports` aircraft jitter randomly (a `move_fraction` of them per step). Given
+# `airports` as (lat array, lon array), every aircraft instead flies great-circle legs between
+# them at its plane_type's cruise speed, `dt` simulated seconds per step, and the snapshot gains
+# `heading` (degrees) and `speed` (km/h) columns.
+class PlaneFeed:
+    def __init__(self, fleet_size, active=None, churn=0.05, move_fraction=1.0, jitter=0.5, seed=None,
+                 airports=None, dt=5.0):
+        self.rng = np.random.default_rng(seed)
+        self.churn = churn
+        self.move_fraction = move_fraction
+        self.jitter = jitter
+        self.dt = dt
+
+        self.titles = fleet_titles(fleet_size)
+        self.lat = self.rng.uniform(-90, 90, fleet_size)
+        self.lon = self.rng.uniform(-180, 180, fleet_size)
+        self.timestamp = np.array(random_timestamps(self.rng, fleet_size), dtype="datetime64[ns]")
+        self.plane_type = np.array(PLANE_TYPES, dtype=object)[self.rng.integers(0, len(PLANE_TYPES), fleet_size)]
+
+        self.active = np.zeros(fleet_size, dtype=bool)
+        active = fleet_size if active is None else min(active, fleet_size)
+        self.active[self.rng.choice(fleet_size, active, replace=False)] = True
+
+        self.routed = airports is not None
+        if self.routed:
+            self.airport_lat, self.airport_lon = (np.asarray(a, dtype=float) for a in airports)
+            self.speed = cruise_speeds(self.plane_type)
+            self.heading = np.zeros(fleet_size)
+            self.dst = np.zeros(fleet_size, dtype=np.int64)
+            everyone = np.arange(fleet_size)
+            self.depart(everyone)
+            # spread the fleet along their first legs
+            self.fly(everyone, self.rng.uniform(0, 12 * 3600, fleet_size))
+            self.timestamp[:] = np.datetime64(pd.Timestamp.now(), "ns")
+
+    # Put aircraft at a random airport, bound for a different one
+    def depart(self, rows):
+        airports = len(self.airport_lat)
+        origin = self.rng.integers(0, airports, len(rows))
+        self.dst[rows] = (origin + self.rng.integers(1, max(airports, 2), len(rows))) % airports
+        self.lat[rows] = self.airport_lat[origin]
+        self.lon[rows] = self.airport_lon[origin]
+        self.heading[rows] = initial_bearing(self.lat[rows], self.lon[rows],
+                                             self.airport_lat[self.dst[rows]], self.airport_lon[self.dst[rows]])
+
+    # Advance aircraft `dt` seconds along their legs; arrivals pick their next destination
+    def fly(self, rows, dt):
+        dst = self.dst[rows]
+        lat, lon, _, arrived = advance(self.lat[rows], self.lon[rows],
+                                       self.airport_lat[dst], self.airport_lon[dst],
+                                       self.speed[rows], dt)
+        self.lat[rows], self.lon[rows] = lat, lon
+
+        landed = rows[arrived]
+        airports = len(self.airport_lat)
+        self.dst[landed] = (self.dst[landed] + self.rng.integers(1, max(airports, 2), len(landed))) % airports
+
+        # heading from the new position, so consumers can extrapolate forward from it
+        dst = self.dst[rows]
+        self.heading[rows] = initial_bearing(lat, lon, self.airport_lat[dst], self.airport_lon[dst])
+
+    def frame(self, rows):
+        columns = {
+            "title": self.titles[rows],
+            "lat": self.lat[rows],
+            "lon": self.lon[rows],
+            "timestamp": self.timestamp[rows],
+            "plane_type": self.plane_type[rows],
+        }
+        if self.routed:
+            columns["heading"] = self.heading[rows]
+            columns["speed"] = self.speed[rows]
+        return pd.DataFrame(columns)
+
+    def snapshot(self):
+        return self.frame(np.flatnonzero(self.active))
+
+    # Advance one step. Returns the full snapshot, or with changes_only=True a frame of the
+    # moved/added rows and an array of the titles that left
+    def step(self, changes_only=False):
+        rng = self.rng
+        active_rows = np.flatnonzero(self.active)
+
+        if self.routed:
+            moved = active_rows
+            self.fly(moved, self.dt)
+            self.timestamp[moved] = np.datetime64(pd.Timestamp.now(), "ns")
+        else:
+            moved = active_rows
+            if self.move_fraction < 1.0:
+                moved = active_rows[rng.random(len(active_rows)) < self.move_fraction]
+            self.lat[moved] = np.clip(self.lat[moved] + rng.uniform(-self.jitter, self.jitter, len(moved)), -90, 90)
+            self.lon[moved] = wrap_longitude(self.lon[moved] + rng.uniform(-self.jitter, self.jitter, len(moved)))
+            self.timestamp[moved] = random_timestamps(rng, len(moved)).to_numpy()
+
+        changes = max(1, int(self.churn * len(active_rows)))
+        inactive_rows = np.flatnonzero(~self.active)
+        additions, removals = churn_counts(rng, changes, len(inactive_rows), len(active_rows))
+        removed = rng.choice(active_rows, removals, replace=False)
+        added = rng.choice(inactive_rows, additions, replace=False)
+        self.active[removed] = False
+        self.active[added] = True
+
+        # aircraft entering the feed appear at an airport (or at a random position)
+        if self.routed:
+            self.depart(added)
+            self.timestamp[added] = np.datetime64(pd.Timestamp.now(), "ns")
+        else:
+            self.lat[added] = rng.uniform(-90, 90, additions)
+            self.lon[added] = rng.uniform(-180, 180, additions)
+            self.timestamp[added] = random_timestamps(rng, additions).to_numpy()
+
+        if not changes_only:
+            return self.snapshot()
+        changed = np.union1d(np.setdiff1d(moved, removed), added)
+        return self.frame(changed), self.titles[removed]
+
+    # SnapshotFeed-compatible generator: the first call returns the current snapshot, later ones step
+    def __call__(self, previous_df=None):
+        return self.snapshot() if previous_df is None else self.step()
+
+
+# Synthetic schedule in the same layout as schedule.csv, for benchmarks and load tests
+def generate_schedule(num_legs, num_airports=500, seed=None):
+    rng = np.random.default_rng(seed)
+    cargo = np.array(["Electronics", "Auto Parts", "Fresh Flowers", "Wines and Spirits",
+                      "Textiles", "Pharmaceuticals", "Machinery", "Mail"])
+
+    airport_names = np.array([f"Airport {i:04d}" for i in range(num_airports)], dtype=object)
+    airport_lat = rng.uniform(-60, 70, num_airports).round(4)
+    airport_lng = rng.uniform(-180, 180, num_airports).round(4)
+
+    src = rng.integers(0, num_airports, num_legs)
+    dst = (src + rng.integers(1, num_airports, num_legs)) % num_airports
+    departure = pd.Timestamp("2023-08-20") + pd.to_timedelta(rng.integers(0, 30 * 24 * 60, num_legs), unit="min")
+    arrival = departure + pd.to_timedelta(rng.integers(60, 18 * 60, num_legs), unit="min")
+
+    return pd.DataFrame({
+        "src_lat": airport_lat[src],
+        "src_lng": airport_lng[src],
+        "dst_lat": airport_lat[dst],
+        "dst_long": airport_lng[dst],
+        "src_name": airport_names[src],
+        "dest_name": airport_names[dst],
+        "weight": rng.integers(1000, 30000, num_legs),
+        "passengers": rng.integers(0, 12, num_legs),
+        "flight_num": "FL" + pd.Series(np.arange(num_legs)).astype(str).str.zfill(7),
+        "cargo_description": cargo[rng.integers(0, len(cargo), num_legs)],
+        "departure_date": departure.strftime("%Y-%m-%d %H:%M"),
+        "arrival_date": arrival.strftime("%Y-%m-%d %H:%M"),
+    })
+
+if __name__ == "__main__":
+    # Example usage
+    current_df = generate_plane_movements()  # First run
+    print(current_df)
+
+    next_df = generate_plane_movements(current_df)  # Subsequent run
+    print(next_df)
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from interval_index import SEPARATION, TimeIntervals, airport_overlaps
+from schedule_loader import typed_schedule
+from test_data import generate_schedule
+
+
+def brute_force_overlaps(df, separation=SEPARATION):
+    events = [(airport, time, leg)
+              for leg, row in enumerate(df.itertuples(index=False))
+              for airport, time in ((str(row.src_name), row.departure_date), (str(row.dest_name), row.arrival_date))]
+    flagged = np.zeros(len(df), dtype=bool)
+    for airport, time, leg in events:
+        for other_airport, other_time, other_leg in events:
+            if other_leg != leg and other_airport == airport and abs(other_time - time) < separation:
+                flagged[leg] = True
+    return flagged
+
+
+def test_airport_overlaps_matches_brute_force():
+    for seed in range(5):
+        df = typed_schedule(generate_schedule(300, num_airports=8, seed=seed))
+        np.testing.assert_array_equal(airport_overlaps(df), brute_force_overlaps(df))
+
+
+def test_airport_overlaps_round_trip_legs():
+    # a leg from an airport back to it has two events there; only other legs count
+    df = pd.DataFrame({
+        'src_name': ['A', 'A', 'B'],
+        'dest_name': ['A', 'B', 'A'],
+        'departure_date': pd.to_datetime(['2023-08-20 10:00', '2023-08-20 10:05', '2023-08-20 12:00']),
+        'arrival_date': pd.to_datetime(['2023-08-20 10:10', '2023-08-20 11:00', '2023-08-20 13:00']),
+    })
+    np.testing.assert_array_equal(airport_overlaps(df), [True, True, False])
+    np.testing.assert_array_equal(airport_overlaps(df.iloc[[0, 2]]), [False, False])
+
+
+def test_overlapping_matches_scan():
+    df = typed_schedule(generate_schedule(500, seed=0))
+    intervals = TimeIntervals(df['departure_date'], df['arrival_date'])
+    starts, ends = df['departure_date'].to_numpy(), df['arrival_date'].to_numpy()
+    rng = np.random.default_rng(0)
+    for minutes in rng.integers(0, 30 * 24 * 60, 50):
+        lo = pd.Timestamp('2023-08-20') + pd.Timedelta(minutes=int(minutes))
+        hi = lo + pd.Timedelta(hours=6)
+        expected = np.flatnonzero((starts <= hi.to_datetime64()) & (ends >= lo.to_datetime64()))
+        np.testing.assert_array_equal(intervals.overlapping(lo, hi), expected)
@@ -0,0 +1,134 @@
+import base64
+import hashlib
+import io
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from schedule_loader import read_schedule
+
+# Server-side cache of parsed uploads, keyed by a hash of the upload contents. Callbacks pass
+# the key around instead of the base64 payload, so a file is decoded and parsed once no matter
+# how many times the selection changes. Least recently used entries are evicted once either
+# the entry count or the total in-memory size of the cached frames goes over its limit.
+# Artifacts built from an upload (e.g. a rendered map) can be memoized next to it with derive().
+
+MAX_ENTRIES = 8
+MAX_BYTES = 512 * 2**20
+
+
+def content_key(contents):
+    return hashlib.sha256(contents.encode('utf-8')).hexdigest()
+
+
+# Decode a dcc.Upload `contents` string into a typed schedule frame
+def parse_upload(contents):
+    content_type, content_string = contents.split(',', 1)
+    decoded = io.StringIO(base64.b64decode(content_string).decode('utf-8'))
+    return read_schedule(decoded)
+
+
+def frame_bytes(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+def object_bytes(value):
+    if isinstance(value, pd.DataFrame):
+        return frame_bytes(value)
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sum(object_bytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(object_bytes(k) + object_bytes(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class UploadCache:
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, parse=parse_upload):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.parse = parse
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    # Parse `contents` unless an identical upload is already cached; returns the cache key
+    def put(self, contents):
+        key = content_key(contents)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return key
+
+        # parse outside the lock so a large upload does not block lookups for other sessions
+        df = self.parse(contents)
+        size = frame_bytes(df)
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (df, size, {})
+                self.total_bytes += size
+            self._entries.move_to_end(key)
+            self._evict(keep=key)
+        return key
+
+    # Cached frame for `key`, or None if it was never stored or has been evicted
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    # Memoize build(df) under `name` for the upload `key`; the result is evicted with the upload.
+    # Returns None if the upload is no longer cached.
+    def derive(self, key, name, build):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            df, _, derived = entry
+            if name in derived:
+                self._entries.move_to_end(key)
+                return derived[name]
+
+        value = build(df)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return value
+            df, size, derived = entry
+            if name not in derived:
+                derived[name] = value
+                added = object_bytes(value)
+                self._entries[key] = (df, size + added, derived)
+                self.total_bytes += added
+            self._entries.move_to_end(key)
+            self._evict(keep=key)
+            return derived[name]
+
+    # Value memoized under `name` for the upload `key`, or None if there is none
+    def derived(self, key, name):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            return entry[2].get(name)
+
+    def _evict(self, keep):
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries
+                                          or self.total_bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            _, size, _ = self._entries.pop(key)
+            self.total_bytes -= size
@@ -0,0 +1,85 @@
+import io
+import os
+import threading
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# A CSV file that is only re-parsed when it changes. Each read() stats the file; when size and
+# mtime are what they were, the cached frame is returned as is. When the file only grew and
+# the bytes read so far are intact (an append), only the new complete lines are parsed and
+# appended. Anything else (rewrite, truncation, replacement) reloads the whole file.
+
+CHECK_BYTES = 4096  # tail of the consumed part compared to tell an append from a rewrite
+
+
+# Append rows to a frame, keeping categorical columns categorical when the categories differ
+def concat_rows(df, rows):
+    combined = pd.concat([df, rows], ignore_index=True)
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype) and isinstance(rows[column].dtype, pd.CategoricalDtype):
+            combined[column] = union_categoricals([df[column], rows[column]])
+    return combined
+
+
+# `read` parses a buffer of CSV text, pd.read_csv by default or e.g. schedule_loader.read_schedule;
+# for appended lines it is called with header=None and the known column names
+class WatchedCSV:
+    def __init__(self, path, read=pd.read_csv, **read_csv_kwargs):
+        self.path = path
+        self.parse = read
+        self.read_csv_kwargs = read_csv_kwargs
+        self.df = None
+        self.stat = None
+        self.offset = 0  # bytes parsed so far, None if the file didn't end in a newline
+        self.check = b''
+        self.reloads = self.appends = 0
+        self._lock = threading.Lock()
+
+    def _signature(self, stat):
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    # The current frame and whether it changed since the previous read()
+    def read(self):
+        with self._lock:
+            stat = os.stat(self.path)
+            if self.df is not None and self._signature(stat) == self._signature(self.stat):
+                return self.df, False
+
+            with open(self.path, 'rb') as f:
+                appended = (self.df is not None and self.offset is not None and stat.st_ino == self.stat.st_ino
+                            and stat.st_size > self.stat.st_size)
+                if appended:
+                    f.seek(self.offset - len(self.check))
+                    appended = f.read(len(self.check)) == self.check
+                if appended:
+                    tail = f.read()
+                else:
+                    f.seek(0)
+                    data = f.read()
+            self.stat = stat
+
+            if appended:
+                return self._append(tail)
+            return self._reload(data)
+
+    def _reload(self, data):
+        self.df = self.parse(io.BytesIO(data), **self.read_csv_kwargs)
+        # an unterminated last line could still be being written, so appends can't follow it
+        self.offset = len(data) if data.endswith(b'\n') else None
+        self.check = data[-CHECK_BYTES:]
+        self.reloads += 1
+        return self.df, True
+
+    # Parse the complete lines of an appended tail; a partial last line waits for the next read
+    def _append(self, tail):
+        lines = tail[:tail.rfind(b'\n') + 1]
+        self.offset += len(lines)
+        self.check = (self.check + lines)[-CHECK_BYTES:]
+        if not lines.strip():
+            return self.df, False
+        new_rows = self.parse(io.BytesIO(lines), header=None, names=list(self.df.columns),
+                              **self.read_csv_kwargs)
+        self.df = concat_rows(self.df, new_rows)
+        self.appends += 1
+        return self.df, True